@@ -0,0 +1,332 @@
+import os
+import click
+from flask.cli import with_appcontext
+
+
+def init_db():
+    """Cria as tabelas e registra/aplica as migrações"""
+    from src.models.nutriai_models import db
+    from src.migrations import upgrade
+
+    # Garante a pasta do SQLite local
+    if db.engine.dialect.name == 'sqlite' and db.engine.url.database:
+        os.makedirs(os.path.dirname(os.path.abspath(db.engine.url.database)), exist_ok=True)
+
+    db.create_all()
+    return upgrade(db.engine)
+
+
+def seed_example_users():
+    """Cria os usuários de exemplo (apenas desenvolvimento)"""
+    from src.models.nutriai_models import db, User
+
+    # Usuário exemplo
+    if not User.query.filter_by(email='ana@email.com').first():
+        user = User(
+            email='ana@email.com',
+            name='Ana Silva',
+            user_type='user',
+            age=34,
+            weight=70.0,
+            height=165.0,
+            goal='Perder peso e controlar hipertensão',
+            budget_per_meal=25.00,
+            dietary_restrictions='Sem lactose'
+        )
+        user.set_password('123456')
+        db.session.add(user)
+
+    # Nutricionista exemplo
+    if not User.query.filter_by(email='maria@nutricionista.com').first():
+        nutritionist = User(
+            email='maria@nutricionista.com',
+            name='Dr. Maria Oliveira',
+            user_type='nutritionist',
+            crn_number='CRN-3 12345',
+            specialization='Nutrição Clínica'
+        )
+        nutritionist.set_password('123456')
+        db.session.add(nutritionist)
+
+    try:
+        db.session.commit()
+    except:
+        db.session.rollback()
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Cria as tabelas e aplica as migrações pendentes"""
+    init_db()
+    click.echo("✅ Banco inicializado")
+
+
+@click.command('seed-db')
+@with_appcontext
+def seed_db_command():
+    """Cria os usuários de exemplo de desenvolvimento"""
+    seed_example_users()
+    click.echo("✅ Usuários de exemplo criados")
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recalcula a tabela nutritionist_stats a partir dos planos"""
+    from src.services.stats_service import rebuild_rollups
+
+    count = rebuild_rollups()
+    click.echo(f"✅ Estatísticas recalculadas para {count} nutricionistas")
+
+
+@click.command('expire-plan-jobs')
+@with_appcontext
+def expire_plan_jobs_command():
+    """Marca como falhos os planos presos em 'generating' (PLAN_JOB_STALE_SECONDS)"""
+    from src.services.plan_jobs import plan_job_queue
+
+    expired = plan_job_queue.expire_stale()
+    click.echo(f"✅ {expired} planos em geração marcados como falhos")
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade_command():
+    """Aplica as migrações de esquema pendentes"""
+    from src.models.nutriai_models import db
+    from src.migrations import upgrade
+
+    applied = upgrade(db.engine)
+    click.echo(f"✅ {len(applied)} migrações aplicadas" if applied else "✅ Esquema já atualizado")
+
+
+@click.command('db-status')
+@with_appcontext
+def db_status_command():
+    """Lista as migrações e se já foram aplicadas"""
+    from src.models.nutriai_models import db
+    from src.migrations import MIGRATIONS, applied_versions
+
+    done = applied_versions(db.engine)
+    for version, description, _ in MIGRATIONS:
+        click.echo(f"{'✅' if version in done else '⏳'} {version} {description}")
+
+
+@click.command('explain-hot-queries')
+@click.option('--database-url', default='sqlite://', help='Banco descartável para a verificação')
+@click.option('--rows', default=1000000, help='Planos a inserir antes do EXPLAIN')
+@click.option('--no-seed', is_flag=True, help='Reaproveita os dados já existentes')
+@with_appcontext
+def explain_hot_queries_command(database_url, rows, no_seed):
+    """Roda EXPLAIN nas consultas quentes e falha se alguma não usar índice"""
+    from src.diagnostics import explain_hot_queries
+
+    results = explain_hot_queries(database_url, rows, seed=not no_seed, log=click.echo)
+
+    failed = False
+    for name, uses_index, plan_lines in results:
+        click.echo(f"{'✅' if uses_index else '❌'} {name}")
+        for line in plan_lines:
+            click.echo(f"    {line}")
+        failed = failed or not uses_index
+
+    if failed:
+        raise click.ClickException('Consultas sem índice encontradas')
+
+
+@click.command('train-plan-dict')
+@click.option('--sample', default=2000, help='Quantidade de planos usados no treino')
+@click.option('--output', default='plan_dict.bin', help='Arquivo do dicionário gerado')
+@with_appcontext
+def train_plan_dict_command(sample, output):
+    """Treina um dicionário de compressão a partir dos planos existentes"""
+    import json
+    from src.models.nutriai_models import DietPlan
+    from src.services.plan_codec import train_dictionary, dict_id
+
+    plans = DietPlan.query.order_by(DietPlan.id.desc()).limit(sample).all()
+    samples = [json.dumps(plan.get_ai_plan(), ensure_ascii=False, separators=(',', ':')) for plan in plans]
+    dictionary = train_dictionary(samples)
+
+    with open(output, 'wb') as f:
+        f.write(dictionary)
+    click.echo(f"✅ Dicionário {dict_id(dictionary):08x} ({len(dictionary)} bytes) salvo em {output}")
+    click.echo(f"   Configure PLAN_CODEC_DICT_PATH={output} e mantenha o arquivo junto do deploy")
+
+
+@click.command('compress-plans')
+@click.option('--codec', default=None, help='zlib ou zstd (padrão: PLAN_STORAGE_CODEC)')
+@click.option('--batch-size', default=500, help='Linhas por transação')
+@with_appcontext
+def compress_plans_command(codec, batch_size):
+    """Comprime em lotes os planos gravados em JSON puro"""
+    from src.services.plan_codec import PlanCodec, backfill_compressed_plans
+
+    plan_codec = PlanCodec(codec or 'zlib')
+    report = backfill_compressed_plans(plan_codec, batch_size=batch_size, log=click.echo)
+
+    click.echo(f"✅ {report['rows']} planos comprimidos com {plan_codec.codec}")
+    click.echo(f"   {report['raw_bytes']} → {report['compressed_bytes']} bytes (taxa {report['ratio']}x)")
+    click.echo(f"   Decodificação: {report['decode_us_per_row']} µs por linha")
+
+
+@click.command('recompute-plan-totals')
+@click.option('--batch-size', default=1000, help='Planos por lote (um cálculo vetorizado por lote)')
+@click.option('--dry-run', is_flag=True, help='Calcula sem gravar')
+@with_appcontext
+def recompute_plan_totals_command(batch_size, dry_run):
+    """Recalcula custo e nutrientes dos planos gravados com o motor local"""
+    from src.services.nutrition import get_nutrition_engine, recompute_plan_totals
+
+    report = recompute_plan_totals(get_nutrition_engine(), batch_size=batch_size, dry_run=dry_run, log=click.echo)
+
+    click.echo(f"✅ {report['rows']} planos recalculados{' (simulação)' if dry_run else ''}")
+    click.echo(f"   Itens reconhecidos: {report['resolved_items']}/{report['items']} ({report['coverage']:.1%})")
+    click.echo(f"   Cálculo: {report['compute_plans_per_second']} planos/s; total: {report['plans_per_second']} planos/s")
+
+
+@click.command('import-food-prices')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Formato do arquivo (padrão: pela extensão)')
+@click.option('--batch-size', default=None, type=int, help='Linhas por lote (padrão: PRICE_IMPORT_BATCH_SIZE)')
+@with_appcontext
+def import_food_prices_command(path, fmt, batch_size):
+    """Importa preços (CSV ou NDJSON; '-' para stdin) com upsert em lotes"""
+    from src.models.nutriai_models import db
+    from src.services.price_ingestion import detect_format, ingest_prices
+
+    fmt = fmt or detect_format(path)
+    if path == '-':
+        stream = click.get_text_stream('stdin', encoding='utf-8-sig')
+    else:
+        stream = open(path, 'r', encoding='utf-8-sig', newline='')
+    with stream:
+        report = ingest_prices(db.engine, stream, fmt, batch_size=batch_size, log=click.echo)
+
+    click.echo(f"✅ {report['rows']} preços importados em {report['seconds']}s "
+               f"({report['rows_per_second']} linhas/s, {report['batches']} lotes)")
+    if report['rejected']:
+        click.echo(f"⚠️ {report['rejected']} linhas ignoradas")
+        for error in report['errors']:
+            click.echo(f"   linha {error['line']}: {error['error']}")
+
+
+@click.command('bench-login')
+@click.option('--duration', default=5.0, help='Duração do benchmark em segundos')
+@click.option('--concurrency', default=None, type=int, help='Logins simultâneos')
+def bench_login_command(duration, concurrency):
+    """Mede a vazão de logins (hashing de senha) por núcleo"""
+    from src.diagnostics import bench_password_hashing
+
+    bench_password_hashing(duration, concurrency, log=click.echo)
+
+
+@click.command('bench-startup')
+@click.option('--runs', default=5, help='Partidas a frio medidas')
+@click.option('--budget-ms', default=None, type=float, help='Limite para a primeira resposta (padrão: STARTUP_BUDGET_MS)')
+def bench_startup_command(runs, budget_ms):
+    """Mede o tempo de importação e da primeira resposta de /api/status"""
+    from src.diagnostics import bench_startup
+
+    budget_ms = budget_ms or float(os.getenv('STARTUP_BUDGET_MS', 1500))
+    report = bench_startup(runs, log=click.echo)
+    click.echo(f"Mediana: import {report['import_ms']} ms, primeira resposta {report['first_response_ms']} ms "
+               f"(limite {budget_ms:.0f} ms)")
+
+    if report['first_response_ms'] > budget_ms:
+        raise click.ClickException('Tempo de inicialização acima do limite')
+
+
+@click.command('bench-plan-generator')
+@click.option('--runs', default=200, help='Perfis gerados pelo otimizador local')
+@click.option('--gemini-runs', default=3, help='Chamadas ao Gemini (0 para pular)')
+@with_appcontext
+def bench_plan_generator_command(runs, gemini_runs):
+    """Compara latência e qualidade do otimizador local com o Gemini"""
+    from src.diagnostics import bench_plan_generation
+
+    bench_plan_generation(runs, gemini_runs, log=click.echo)
+
+
+@click.command('bench-food-index')
+@click.option('--entries', default=100000, help='Preços sintéticos no índice')
+@click.option('--queries', default=2000, help='Consultas medidas')
+def bench_food_index_command(entries, queries):
+    """Mede a latência da busca aproximada de nomes de alimentos"""
+    from src.diagnostics import bench_food_index
+
+    bench_food_index(entries, queries, log=click.echo)
+
+
+@click.command('bench-gemini-resilience')
+@click.option('--calls', default=200, help='Chamadas por cenário')
+@click.option('--concurrency', default=8, help='Chamadas simultâneas')
+@click.option('--latency-ms', default=200, help='Latência média do modelo falso')
+@click.option('--failure-rate', default=0.05, help='Fração de chamadas que falham')
+@click.option('--hang-rate', default=0.03, help='Fração de chamadas que travam')
+@click.option('--timeout', default=1.0, help='Prazo por chamada (segundos)')
+def bench_gemini_resilience_command(calls, concurrency, latency_ms, failure_rate, hang_rate, timeout):
+    """Mede prazo, disjuntor e hedge contra o modelo falso (sem rede)"""
+    from src.diagnostics import bench_gemini_resilience
+
+    bench_gemini_resilience(calls, concurrency, latency_ms, latency_ms // 2, failure_rate, hang_rate, timeout,
+                            log=click.echo)
+
+
+@click.command('bench-gemini-quota')
+@click.option('--duration', default=5.0, help='Duração de cada cenário (segundos)')
+@click.option('--workers', default=4, help='Processos simulados (agendadores independentes)')
+@click.option('--threads', default=6, help='Requisições simultâneas por processo')
+@click.option('--rpm', default=600, help='Cota do modelo falso (chamadas por minuto)')
+def bench_gemini_quota_command(duration, workers, threads, rpm):
+    """Mede o agendador de cota contra o modelo falso com limite de chamadas"""
+    from src.diagnostics import bench_gemini_quota
+
+    bench_gemini_quota(duration, workers, threads, rpm, log=click.echo)
+
+
+@click.command('bench-plan-reuse')
+@click.option('--plans', default=50000, help='Planos aprovados sintéticos no índice')
+@click.option('--queries', default=2000, help='Consultas medidas')
+def bench_plan_reuse_command(plans, queries):
+    """Mede a busca de planos aprovados para perfis parecidos"""
+    from src.diagnostics import bench_plan_reuse
+
+    bench_plan_reuse(plans, queries, log=click.echo)
+
+
+@click.command('compress-static')
+@click.option('--min-size', default=1024, help='Tamanho mínimo (bytes) para comprimir')
+@with_appcontext
+def compress_static_command(min_size):
+    """Gera as variantes .gz/.br dos arquivos estáticos"""
+    from flask import current_app
+    from src.static_assets import precompress_static
+
+    generated = precompress_static(current_app.static_folder, min_size=min_size, log=click.echo)
+    click.echo(f"✅ {generated} variantes comprimidas geradas")
+
+
+def register_commands(app):
+    """Registra os comandos de linha de comando do NutriAI"""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_db_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(expire_plan_jobs_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_status_command)
+    app.cli.add_command(explain_hot_queries_command)
+    app.cli.add_command(train_plan_dict_command)
+    app.cli.add_command(compress_plans_command)
+    app.cli.add_command(bench_login_command)
+    app.cli.add_command(bench_startup_command)
+    app.cli.add_command(compress_static_command)
+    app.cli.add_command(recompute_plan_totals_command)
+    app.cli.add_command(bench_plan_generator_command)
+    app.cli.add_command(import_food_prices_command)
+    app.cli.add_command(bench_food_index_command)
+    app.cli.add_command(bench_gemini_resilience_command)
+    app.cli.add_command(bench_gemini_quota_command)
+    app.cli.add_command(bench_plan_reuse_command)
@@ -0,0 +1,152 @@
+"""
+Configuração do pool de conexões (Neon, PgBouncer, serverless) e métricas.
+"""
+import os
+import threading
+import time
+from typing import Dict, Any
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, NullPool
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+class PoolMetrics:
+    """Contadores de uso do pool, incluindo o tempo de espera por conexão"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 3)
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Mede o tempo que cada requisição espera por uma conexão do pool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_InstrumentedPoolMixin, NullPool):
+    pass
+
+
+def build_engine_options(database_url: str) -> Dict[str, Any]:
+    """
+    Monta SQLALCHEMY_ENGINE_OPTIONS a partir das variáveis DB_POOL_*.
+    DB_POOL_MODE=null desativa o pool local (PgBouncer/Neon pooler, serverless).
+    """
+    if database_url.startswith('sqlite'):
+        options = {'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', '1')}
+        # Banco em memória usa o pool padrão do SQLAlchemy (conexão única)
+        if database_url not in ('sqlite://', 'sqlite:///:memory:'):
+            options['poolclass'] = InstrumentedQueuePool
+        return options
+
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', '1'),
+    }
+
+    if os.getenv('DB_POOL_MODE', 'queue').lower() == 'null':
+        options['poolclass'] = InstrumentedNullPool
+    else:
+        options.update({
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+            # Neon encerra conexões ociosas; reciclar antes evita erros de conexão velha
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 300)),
+            'pool_use_lifo': True,
+        })
+
+    connect_args = {}
+    statement_timeout = os.getenv('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout:
+        connect_args['options'] = f"-c statement_timeout={int(statement_timeout)}"
+    connect_timeout = os.getenv('DB_CONNECT_TIMEOUT')
+    if connect_timeout:
+        connect_args['connect_timeout'] = int(connect_timeout)
+    if connect_args:
+        options['connect_args'] = connect_args
+
+    return options
+
+
+def instrument_engine(engine):
+    """Registra os eventos que alimentam as métricas do pool"""
+    pool = engine.pool
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is None:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        with metrics._lock:
+            metrics.connects += 1
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with metrics._lock:
+            metrics.invalidations += 1
+
+
+def pool_stats(engine) -> Dict[str, Any]:
+    """Estatísticas atuais do pool de conexões"""
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+        })
+
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        stats.update(metrics.snapshot())
+    return stats
@@ -0,0 +1,115 @@
+"""
+GET condicional e compressão das respostas da API.
+
+Os ETags são calculados a partir de (id, versão) das linhas, antes da
+serialização: clientes que fazem polling recebem 304 sem que o plano seja
+decodificado nem convertido em JSON.
+"""
+import gzip
+import hashlib
+import os
+from typing import Iterable, Optional
+
+from flask import Response, request
+
+from src.static_assets import ENCODINGS, accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+API_CACHE_CONTROL = 'private, no-cache'
+
+
+def make_etag(*parts: Iterable) -> str:
+    """ETag a partir de valores já conhecidos (ids, versões, contagens)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def is_fresh(etag: str) -> bool:
+    """Indica se o cliente já tem esta versão (em qualquer codificação)"""
+    candidates = [etag] + [f"{etag}-{encoding}" for encoding, _ in ENCODINGS]
+    return any(request.if_none_match.contains(candidate) for candidate in candidates)
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """Resposta 304 se o cliente já tem esta versão"""
+    if not is_fresh(etag):
+        return None
+
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = API_CACHE_CONTROL
+    return response
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Adiciona ETag e Cache-Control (revalidação obrigatória) à resposta"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = API_CACHE_CONTROL
+    return response
+
+
+class ResponseCompressor:
+    """
+    Comprime (brotli ou gzip) respostas da API acima de API_COMPRESS_MIN_SIZE.
+    Respostas em streaming (SSE), arquivos e corpos já codificados passam intactos.
+    """
+
+    def __init__(self, min_size: int = None, level: int = None):
+        self.enabled = os.getenv('API_COMPRESS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+        self.min_size = min_size or int(os.getenv('API_COMPRESS_MIN_SIZE', 1024))
+        self.level = level or int(os.getenv('API_COMPRESS_LEVEL', 6))
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def _choose_encoding(self) -> Optional[str]:
+        accepted = accepted_encodings()
+        for encoding, _ in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            if encoding in accepted:
+                return encoding
+        return None
+
+    def compress(self, response):
+        if (not self.enabled
+                or response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=min(self.level, 11))
+        else:
+            compressed = gzip.compress(data, compresslevel=min(self.level, 9))
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+
+        # ETag forte distinto por representação
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+
+response_compressor = ResponseCompressor()
@@ -3,7 +3,7 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
@@ -15,123 +15,153 @@ load_dotenv()
 from src.models.nutriai_models import db
 from src.routes.auth import auth_bp
 from src.routes.diet_plans import diet_plans_bp
+from src.routes.food_prices import food_prices_bp
+from src.commands import register_commands
+from src.database import build_engine_options, instrument_engine, pool_stats
+from src.static_assets import AssetManifest, send_asset
+from src.http_cache import response_compressor
+
+def get_database_url():
+    """Retorna (url, é_neon) - prioriza Neon, SQLite local em desenvolvimento"""
+    database_url = os.getenv('NEON_DATABASE_URL')
+    if database_url and database_url != 'your_neon_database_url_here':
+        return database_url, True
+    return f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}", False
+
+def create_app():
+    """
+    Cria a aplicação sem acessar o banco nem o Gemini: o esquema e os dados
+    de exemplo vêm dos comandos init-db e seed-db, e o cliente do Gemini é
+    criado no primeiro uso.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configurações de produção
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'nutriai_flask_secret_key_2025')
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'nutriai_super_secret_key_2025')
+
+    # CORS para produção
+    cors_origins = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173')
+    CORS(app, origins=cors_origins.split(','))
+
+    # JWT
+    JWTManager(app)
+
+    # Banco de dados - prioriza Neon
+    database_url, is_neon = get_database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    if is_neon:
+        print("✅ Conectado ao banco Neon")
+    else:
+        print("⚠️ Usando SQLite local. Configure NEON_DATABASE_URL para produção.")
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Configurações de produção
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'nutriai_flask_secret_key_2025')
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'nutriai_super_secret_key_2025')
+    # Pool de conexões (pre-ping, recycle, tamanho, NullPool para PgBouncer/serverless)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(database_url)
 
-# CORS para produção
-cors_origins = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173')
-CORS(app, origins=cors_origins.split(','))
+    # Inicializa banco (a conexão só é aberta na primeira consulta)
+    db.init_app(app)
+    with app.app_context():
+        instrument_engine(db.engine)
 
-# JWT
-jwt = JWTManager(app)
+    # Registra blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(diet_plans_bp, url_prefix='/api/diet-plans')
+    app.register_blueprint(food_prices_bp, url_prefix='/api/food-prices')
 
-# Banco de dados - prioriza Neon
-database_url = os.getenv('NEON_DATABASE_URL')
-if database_url and database_url != 'your_neon_database_url_here':
-    # Produção com Neon
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-    print("✅ Conectado ao banco Neon")
-else:
-    # Desenvolvimento com SQLite
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-    print("⚠️ Usando SQLite local. Configure NEON_DATABASE_URL para produção.")
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Inicializa banco
-db.init_app(app)
-
-# Registra blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(diet_plans_bp, url_prefix='/api/diet-plans')
-
-# Cria tabelas e dados iniciais
-with app.app_context():
-    db.create_all()
-    
-    # Cria usuários de exemplo apenas em desenvolvimento
-    if not database_url or database_url == 'your_neon_database_url_here':
-        from src.models.nutriai_models import User
-        
-        # Usuário exemplo
-        if not User.query.filter_by(email='ana@email.com').first():
-            user = User(
-                email='ana@email.com',
-                name='Ana Silva',
-                user_type='user',
-                age=34,
-                weight=70.0,
-                height=165.0,
-                goal='Perder peso e controlar hipertensão',
-                budget_per_meal=25.00,
-                dietary_restrictions='Sem lactose'
-            )
-            user.set_password('123456')
-            db.session.add(user)
-        
-        # Nutricionista exemplo
-        if not User.query.filter_by(email='maria@nutricionista.com').first():
-            nutritionist = User(
-                email='maria@nutricionista.com',
-                name='Dr. Maria Oliveira',
-                user_type='nutritionist',
-                crn_number='CRN-3 12345',
-                specialization='Nutrição Clínica'
-            )
-            nutritionist.set_password('123456')
-            db.session.add(nutritionist)
-        
-        try:
-            db.session.commit()
-        except:
-            db.session.rollback()
-
-# Rota para servir frontend
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+    # Comandos de linha de comando (flask --app src.main <comando>)
+    register_commands(app)
+
+    register_core_routes(app)
+
+    # Compressão gzip/brotli das respostas da API acima do limite
+    response_compressor.init_app(app)
+
+    # Atalho de desenvolvimento: cria esquema e usuários de exemplo ao iniciar
+    if os.getenv('AUTO_INIT_DB', '0').lower() in ('1', 'true', 'yes'):
+        from src.commands import init_db, seed_example_users
+        with app.app_context():
+            init_db()
+            if not is_neon:
+                seed_example_users()
+
+    return app
+
+def register_core_routes(app):
+    """Registra as rotas do frontend, de status e de métricas"""
+
+    # Manifesto dos arquivos estáticos, montado uma única vez
+    manifest = AssetManifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+
+    # Rota para servir frontend
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if app.static_folder is None:
+            return "Static folder not configured", 404
+
+        if os.getenv('STATIC_MANIFEST_RELOAD', '0').lower() in ('1', 'true', 'yes'):
+            manifest.build()
+
+        asset = manifest.get(path) if path != "" else None
+        if asset is not None:
+            return send_asset(asset)
         else:
-            return {
-                "message": "NutriAI Backend funcionando!",
-                "status": "online",
-                "frontend": "Coloque os arquivos do React na pasta static/",
-                "api_docs": "/api/status"
-            }, 200
-
-# Rota de status da API
-@app.route('/api/status')
-def api_status():
-    gemini_key = os.getenv('GEMINI_API_KEY')
-    neon_url = os.getenv('NEON_DATABASE_URL')
-    
-    return {
-        'status': 'online',
-        'message': 'NutriAI API funcionando',
-        'version': '1.0.0',
-        'environment': os.getenv('FLASK_ENV', 'development'),
-        'database': 'Neon' if (neon_url and neon_url != 'your_neon_database_url_here') else 'SQLite',
-        'gemini_configured': bool(gemini_key and gemini_key != 'your_gemini_api_key_here'),
-        'endpoints': {
-            'auth': '/api/auth/login',
-            'register': '/api/auth/register',
-            'generate_plan': '/api/diet-plans/generate',
-            'my_plans': '/api/diet-plans/my-plans'
+            if manifest.index is not None:
+                return send_asset(manifest.index)
+            else:
+                return {
+                    "message": "NutriAI Backend funcionando!",
+                    "status": "online",
+                    "frontend": "Coloque os arquivos do React na pasta static/",
+                    "api_docs": "/api/status"
+                }, 200
+
+    # Rota de status da API
+    @app.route('/api/status')
+    def api_status():
+        gemini_key = os.getenv('GEMINI_API_KEY')
+        neon_url = os.getenv('NEON_DATABASE_URL')
+
+        return {
+            'status': 'online',
+            'message': 'NutriAI API funcionando',
+            'version': '1.0.0',
+            'environment': os.getenv('FLASK_ENV', 'development'),
+            'database': 'Neon' if (neon_url and neon_url != 'your_neon_database_url_here') else 'SQLite',
+            'gemini_configured': bool(gemini_key and gemini_key != 'your_gemini_api_key_here'),
+            'endpoints': {
+                'auth': '/api/auth/login',
+                'register': '/api/auth/register',
+                'generate_plan': '/api/diet-plans/generate',
+                'my_plans': '/api/diet-plans/my-plans'
+            }
         }
-    }
+
+    # Rota de métricas internas
+    @app.route('/api/metrics')
+    def api_metrics():
+        from src.routes.admin_auth import is_admin_request
+        from src.services.gemini_service import gemini_service
+        from src.services.plan_index import approved_plan_index
+        from src.services.plan_jobs import plan_job_queue
+
+        if not is_admin_request():
+            return {'error': 'Acesso negado'}, 403
+
+        return {
+            'plan_cache': gemini_service.cache.stats(),
+            'gemini': gemini_service.resilience.stats(),
+            'gemini_quota': gemini_service.quota.stats(),
+            'gemini_parse': gemini_service.parse_stats.stats(),
+            'plan_reuse': approved_plan_index.stats(),
+            'plan_jobs': plan_job_queue.stats(),
+            'db_pool': pool_stats(db.engine)
+        }
+
+app = create_app()
 
 # Para Vercel
 app.wsgi_app = app.wsgi_app
@@ -139,4 +169,3 @@ app.wsgi_app = app.wsgi_app
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV') != 'production')
-
@@ -0,0 +1,197 @@
+"""
+Migrações de esquema versionadas.
+
+db.create_all() só cria tabelas novas; alterações em tabelas existentes
+(índices, colunas) ficam aqui, em ordem, registradas em schema_migrations.
+Cada passo é idempotente para que bancos criados por create_all() possam
+aplicar a sequência completa sem erro.
+"""
+import json
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+
+def create_index(conn, name, table, columns, unique=False):
+    """Cria um índice se ainda não existir (CONCURRENTLY no PostgreSQL)"""
+    unique_sql = 'UNIQUE ' if unique else ''
+    concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+    if concurrently:
+        # Um CREATE INDEX CONCURRENTLY interrompido deixa o índice INVALID, que o
+        # IF NOT EXISTS pularia para sempre: remove e cria de novo
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND c.relkind = 'i' AND pg_table_is_visible(c.oid) AND NOT i.indisvalid"
+        ), {'name': name}).first()
+        if invalid:
+            print(f"⚠️ Índice {name} inválido (criação interrompida): recriando")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(
+        f"CREATE {unique_sql}INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    ))
+
+
+def add_column(conn, table, name, ddl):
+    """Adiciona uma coluna se ainda não existir"""
+    columns = {column['name'] for column in inspect(conn).get_columns(table)}
+    if name not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def _0001_diet_plans_hot_indexes(conn):
+    create_index(conn, 'ix_diet_plans_status_created_at', 'diet_plans', ['status', 'created_at', 'id'])
+    create_index(conn, 'ix_diet_plans_user_id_created_at', 'diet_plans', ['user_id', 'created_at', 'id'])
+    create_index(conn, 'ix_diet_plans_nutritionist_id_status', 'diet_plans', ['nutritionist_id', 'status'])
+
+
+def _0002_diet_plans_json_totals(conn):
+    wrap_invalid_plan_json(conn)
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            "ALTER TABLE diet_plans ALTER COLUMN ai_plan TYPE JSONB USING ai_plan::jsonb"
+        ))
+
+    for column in ('total_cost', 'total_calories', 'total_protein', 'total_carbs', 'total_fat'):
+        add_column(conn, 'diet_plans', column, 'FLOAT')
+
+    backfill_plan_totals(conn)
+
+    create_index(conn, 'ix_diet_plans_total_cost', 'diet_plans', ['total_cost'])
+    create_index(conn, 'ix_diet_plans_total_calories', 'diet_plans', ['total_calories'])
+
+
+def _reject_constant(name):
+    # NaN e Infinity passam no json.loads, mas não no JSONB do PostgreSQL
+    raise ValueError(f'Constante {name} fora do JSON')
+
+
+def wrap_invalid_plan_json(conn, batch_size=1000):
+    """
+    O esquema antigo gravava o texto da IA como veio: planos que não são JSON
+    válido abortariam a conversão para JSONB. Viram {"legacy_text": texto
+    original}, sem perder o conteúdo
+    """
+    last_id = wrapped = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, ai_plan FROM diet_plans WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for plan_id, ai_plan in rows:
+            if not isinstance(ai_plan, str):
+                continue
+            try:
+                json.loads(ai_plan, parse_constant=_reject_constant)
+            except ValueError:
+                updates.append({'id': plan_id, 'ai_plan': json.dumps({'legacy_text': ai_plan})})
+
+        if updates:
+            conn.execute(text("UPDATE diet_plans SET ai_plan = :ai_plan WHERE id = :id"), updates)
+            wrapped += len(updates)
+        last_id = rows[-1][0]
+
+    if wrapped:
+        print(f"⚠️ {wrapped} planos com ai_plan fora do JSON guardados em legacy_text")
+
+
+def backfill_plan_totals(conn, batch_size=1000):
+    """Preenche as colunas de totais dos planos antigos, em lotes"""
+    from src.models.nutriai_models import DietPlan
+
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, ai_plan FROM diet_plans WHERE id > :last_id AND total_cost IS NULL "
+            "ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for plan_id, ai_plan in rows:
+            plan_dict = json.loads(ai_plan) if isinstance(ai_plan, str) else (ai_plan or {})
+            updates.append({'id': plan_id, **DietPlan.extract_totals(plan_dict)})
+
+        conn.execute(text(
+            "UPDATE diet_plans SET total_cost = :total_cost, total_calories = :total_calories, "
+            "total_protein = :total_protein, total_carbs = :total_carbs, total_fat = :total_fat "
+            "WHERE id = :id"
+        ), updates)
+        last_id = rows[-1][0]
+
+
+def _0003_diet_plans_compressed_body(conn):
+    blob_type = 'BYTEA' if conn.dialect.name == 'postgresql' else 'BLOB'
+    add_column(conn, 'diet_plans', 'ai_plan_blob', blob_type)
+
+
+def _0004_diet_plans_updated_at(conn):
+    timestamp_type = 'TIMESTAMP' if conn.dialect.name == 'postgresql' else 'DATETIME'
+    add_column(conn, 'diet_plans', 'updated_at', timestamp_type)
+    conn.execute(text(
+        "UPDATE diet_plans SET updated_at = COALESCE(validated_at, created_at) WHERE updated_at IS NULL"
+    ))
+
+
+def _0005_food_prices_upsert_key(conn):
+    # NULL não conflita em índices únicos: normaliza para '' antes de deduplicar
+    conn.execute(text("UPDATE food_prices SET supermarket = '' WHERE supermarket IS NULL"))
+    conn.execute(text("UPDATE food_prices SET location = '' WHERE location IS NULL"))
+    conn.execute(text(
+        "DELETE FROM food_prices WHERE id NOT IN ("
+        "SELECT MAX(id) FROM food_prices GROUP BY food_name, supermarket, location)"
+    ))
+    create_index(conn, 'ux_food_prices_name_supermarket_location', 'food_prices',
+                 ['food_name', 'supermarket', 'location'], unique=True)
+    create_index(conn, 'ix_food_prices_location_food_name', 'food_prices', ['location', 'food_name'])
+    create_index(conn, 'ix_food_prices_updated_at', 'food_prices', ['updated_at'])
+
+
+# (versão, descrição, função) — sempre acrescente no final
+MIGRATIONS = [
+    ('0001', 'Índices compostos das consultas de diet_plans', _0001_diet_plans_hot_indexes),
+    ('0002', 'ai_plan em JSON nativo e colunas de totais', _0002_diet_plans_json_totals),
+    ('0003', 'Corpo comprimido dos planos (ai_plan_blob)', _0003_diet_plans_compressed_body),
+    ('0004', 'Versão dos planos (updated_at) para ETags', _0004_diet_plans_updated_at),
+    ('0005', 'Chave única e índices de consulta de food_prices', _0005_food_prices_upsert_key),
+]
+
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version VARCHAR(50) PRIMARY KEY, description VARCHAR(255), applied_at TIMESTAMP)"
+    ))
+
+
+def applied_versions(engine):
+    """Retorna o conjunto de versões já aplicadas"""
+    with engine.connect() as conn:
+        _ensure_migrations_table(conn)
+        conn.commit()
+        return {row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+
+def upgrade(engine, log=print):
+    """Aplica as migrações pendentes em ordem; retorna as versões aplicadas"""
+    done = applied_versions(engine)
+    applied = []
+
+    # AUTOCOMMIT: CREATE INDEX CONCURRENTLY não pode rodar dentro de transação
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for version, description, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            log(f"→ Aplicando {version}: {description}")
+            migrate(conn)
+            conn.execute(
+                text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+            applied.append(version)
+
+    return applied
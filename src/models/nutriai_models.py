@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.password_hasher import password_hasher
 import json
 
 db = SQLAlchemy()
@@ -32,10 +33,13 @@ class User(db.Model):
     validated_plans = db.relationship('DietPlan', backref='nutritionist', lazy=True, foreign_keys='DietPlan.nutritionist_id')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -56,6 +60,16 @@ class User(db.Model):
 
 class DietPlan(db.Model):
     __tablename__ = 'diet_plans'
+    __table_args__ = (
+        # Listagens: pendentes e planos do usuário, ordenados por (created_at, id)
+        db.Index('ix_diet_plans_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_diet_plans_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # Estatísticas do nutricionista
+        db.Index('ix_diet_plans_nutritionist_id_status', 'nutritionist_id', 'status'),
+        # Filtros e ordenação por custo/calorias
+        db.Index('ix_diet_plans_total_cost', 'total_cost'),
+        db.Index('ix_diet_plans_total_calories', 'total_calories'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -66,8 +80,17 @@ class DietPlan(db.Model):
     budget_per_meal = db.Column(db.Float, nullable=False)
     dietary_restrictions = db.Column(db.Text)
     
-    # Plano gerado pela IA (JSON)
-    ai_plan = db.Column(db.Text, nullable=False)  # JSON string
+    # Plano gerado pela IA (JSONB no PostgreSQL, JSON/texto nos demais)
+    ai_plan = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'), nullable=False)
+    # Corpo comprimido (PLAN_STORAGE_CODEC); quando presente, ai_plan fica como JSON null
+    ai_plan_blob = db.Column(db.LargeBinary)
+    
+    # Totais extraídos do plano na gravação (permitem filtrar/ordenar no banco)
+    total_cost = db.Column(db.Float)
+    total_calories = db.Column(db.Float)
+    total_protein = db.Column(db.Float)
+    total_carbs = db.Column(db.Float)
+    total_fat = db.Column(db.Float)
     
     # Status e validação
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
@@ -76,17 +99,83 @@ class DietPlan(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     validated_at = db.Column(db.DateTime)
+    # Versão da linha: muda a cada alteração e alimenta o ETag das respostas
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Colunas escalares usadas nas listagens resumidas (sem decodificar ai_plan)
+    SUMMARY_FIELDS = (
+        'id', 'user_id', 'nutritionist_id', 'goal', 'budget_per_meal', 'dietary_restrictions',
+        'status', 'created_at', 'validated_at', 'total_cost', 'total_calories', 'total_protein',
+        'total_carbs', 'total_fat'
+    )
+    
+    @classmethod
+    def summary_columns(cls):
+        return [getattr(cls, field) for field in cls.SUMMARY_FIELDS]
+    
+    @classmethod
+    def summary_from_row(cls, row):
+        """Monta o dicionário resumido a partir de uma linha com SUMMARY_FIELDS"""
+        data = dict(row._mapping)
+        for field in ('created_at', 'validated_at'):
+            data[field] = data[field].isoformat() if data[field] else None
+        return data
     
     def get_ai_plan(self):
         """Retorna o plano da IA como dicionário"""
         try:
-            return json.loads(self.ai_plan)
+            if self.ai_plan_blob is not None:
+                from src.services.plan_codec import get_codec
+                return get_codec().decode(self.ai_plan_blob)
+            if isinstance(self.ai_plan, str):
+                return json.loads(self.ai_plan)
+            return self.ai_plan or {}
         except:
             return {}
     
     def set_ai_plan(self, plan_dict):
         """Define o plano da IA a partir de um dicionário"""
-        self.ai_plan = json.dumps(plan_dict)
+        from src.services.plan_codec import get_codec
+        
+        codec = get_codec()
+        if codec.enabled:
+            self.ai_plan = None
+            self.ai_plan_blob = codec.encode(plan_dict)
+        else:
+            self.ai_plan = plan_dict
+            self.ai_plan_blob = None
+        self.set_totals(plan_dict)
+    
+    @staticmethod
+    def extract_totals(plan_dict):
+        """Extrai custo, calorias e macros totais do plano"""
+        def number(value):
+            try:
+                return float(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
+        
+        macros = plan_dict.get('total_macros') or {}
+        if not isinstance(macros, dict):
+            macros = {}
+        return {
+            'total_cost': number(plan_dict.get('total_cost')),
+            'total_calories': number(plan_dict.get('total_calories')),
+            'total_protein': number(macros.get('protein')),
+            'total_carbs': number(macros.get('carbs')),
+            'total_fat': number(macros.get('fat'))
+        }
+    
+    def set_totals(self, plan_dict):
+        """Atualiza as colunas de totais a partir do plano"""
+        for field, value in self.extract_totals(plan_dict).items():
+            setattr(self, field, value)
+    
+    @staticmethod
+    def version_of(updated_at, validated_at, created_at):
+        """Versão usada no ETag (planos anteriores à coluna updated_at usam as datas de validação/criação)"""
+        version = updated_at or validated_at or created_at
+        return version.isoformat() if version else ''
     
     def to_dict(self):
         return {
@@ -97,6 +186,8 @@ class DietPlan(db.Model):
             'budget_per_meal': self.budget_per_meal,
             'dietary_restrictions': self.dietary_restrictions,
             'ai_plan': self.get_ai_plan(),
+            'total_cost': self.total_cost,
+            'total_calories': self.total_calories,
             'status': self.status,
             'nutritionist_feedback': self.nutritionist_feedback,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -107,14 +198,21 @@ class DietPlan(db.Model):
 
 class FoodPrice(db.Model):
     __tablename__ = 'food_prices'
+    __table_args__ = (
+        # Chave do upsert da importação (supermercado/local vazios em vez de NULL)
+        db.Index('ux_food_prices_name_supermarket_location', 'food_name', 'supermarket', 'location', unique=True),
+        # Preços por local e atualização incremental dos índices em memória
+        db.Index('ix_food_prices_location_food_name', 'location', 'food_name'),
+        db.Index('ix_food_prices_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     food_name = db.Column(db.String(100), nullable=False)
     price_per_unit = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(20), nullable=False)  # kg, g, unidade, etc
-    supermarket = db.Column(db.String(50))
-    location = db.Column(db.String(100))
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    supermarket = db.Column(db.String(50), default='')
+    location = db.Column(db.String(100), default='')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         return {
@@ -156,3 +254,31 @@ class Subscription(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+class PlanCacheEntry(db.Model):
+    __tablename__ = 'plan_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(80), unique=True, nullable=False)
+    plan = db.Column(db.Text, nullable=False)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime)
+
+class NutritionistStats(db.Model):
+    __tablename__ = 'nutritionist_stats'
+    
+    nutritionist_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_validated = db.Column(db.Integer, nullable=False, default=0)
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    unique_patients = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class QuotaBucket(db.Model):
+    __tablename__ = 'quota_buckets'
+    
+    # Balde de tokens compartilhado entre os workers (ver services/quota_scheduler.py)
+    name = db.Column(db.String(50), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False, default=0.0)
+    rate_factor = db.Column(db.Float, nullable=False, default=1.0)
+    updated = db.Column(db.Float, nullable=False, default=0.0)  # epoch em segundos
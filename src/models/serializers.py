@@ -0,0 +1,48 @@
+from sqlalchemy.orm import aliased, joinedload
+from src.models.nutriai_models import User, DietPlan
+
+# Relacionamentos que cada formato de resposta precisa
+PLAN_VIEWS = {
+    'summary': (),
+    'full': ('user', 'nutritionist'),
+}
+
+
+def plan_load_options(view='full'):
+    """Opções de carregamento antecipado para evitar N+1 em DietPlan.to_dict"""
+    options = []
+    for relationship in PLAN_VIEWS[view]:
+        attr = getattr(DietPlan, relationship)
+        options.append(joinedload(attr).load_only(User.name))
+    return options
+
+
+def plan_query(view='full'):
+    """Consulta de DietPlan já com os relacionamentos necessários ao formato"""
+    return DietPlan.query.options(*plan_load_options(view))
+
+
+def summary_query(query):
+    """
+    Projeta a consulta para as colunas resumidas mais os nomes de usuário e
+    nutricionista, tudo em um único SELECT com JOIN
+    """
+    patient = aliased(User)
+    nutritionist = aliased(User)
+    return (
+        query
+        .outerjoin(patient, DietPlan.user_id == patient.id)
+        .outerjoin(nutritionist, DietPlan.nutritionist_id == nutritionist.id)
+        .with_entities(
+            *DietPlan.summary_columns(),
+            patient.name.label('user_name'),
+            nutritionist.name.label('nutritionist_name')
+        )
+    )
+
+
+def serialize_plans(items, view='full'):
+    """Serializa planos (ou linhas resumidas) no formato pedido"""
+    if view == 'summary':
+        return [DietPlan.summary_from_row(row) for row in items]
+    return [plan.to_dict() for plan in items]
@@ -0,0 +1,11 @@
+import hmac
+import os
+
+from flask import request
+
+
+def is_admin_request() -> bool:
+    """Confere o cabeçalho X-Admin-Token com ADMIN_API_TOKEN (rotas administrativas)"""
+    expected = os.getenv('ADMIN_API_TOKEN')
+    provided = request.headers.get('X-Admin-Token', '')
+    return bool(expected) and hmac.compare_digest(provided.encode(), expected.encode())
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from src.models.nutriai_models import db, User
-from datetime import timedelta
+from src.services.identity import create_user_token, current_identity, invalidate_identity
+from src.services.password_hasher import PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -46,11 +47,8 @@ def register():
         db.session.add(user)
         db.session.commit()
         
-        # Cria token de acesso
-        access_token = create_access_token(
-            identity=user.id,
-            expires_delta=timedelta(days=7)
-        )
+        # Cria token de acesso (com as claims de autorização)
+        access_token = create_user_token(user)
         
         return jsonify({
             'message': 'Usuário criado com sucesso',
@@ -58,6 +56,9 @@ def register():
             'user': user.to_dict()
         }), 201
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -77,11 +78,13 @@ def login():
         if not user or not user.check_password(data['password']):
             return jsonify({'error': 'Email ou senha inválidos'}), 401
         
-        # Cria token de acesso
-        access_token = create_access_token(
-            identity=user.id,
-            expires_delta=timedelta(days=7)
-        )
+        # Atualiza hashes gerados com parâmetros antigos
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
+        
+        # Cria token de acesso (com as claims de autorização)
+        access_token = create_user_token(user)
         
         return jsonify({
             'message': 'Login realizado com sucesso',
@@ -89,7 +92,11 @@ def login():
             'user': user.to_dict()
         }), 200
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
@@ -97,7 +104,7 @@ def login():
 def get_current_user():
     """Retorna dados do usuário atual"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_identity().id
         user = User.query.get(user_id)
         
         if not user:
@@ -113,7 +120,7 @@ def get_current_user():
 def update_profile():
     """Atualiza perfil do usuário"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_identity().id
         user = User.query.get(user_id)
         
         if not user:
@@ -148,6 +155,7 @@ def update_profile():
                 user.specialization = data['specialization']
         
         db.session.commit()
+        invalidate_identity(user_id)
         
         return jsonify({
             'message': 'Perfil atualizado com sucesso',
@@ -1,34 +1,96 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context
+from flask_jwt_extended import jwt_required
 from src.models.nutriai_models import db, User, DietPlan
+from src.models.serializers import plan_load_options, plan_query, summary_query, serialize_plans
 from src.services.gemini_service import gemini_service
+from src.services.plan_jobs import plan_job_queue
+from src.services.identity import current_identity
+from src.services.stats_service import read_stats, format_stats, record_validation
+from src.http_cache import make_etag, is_fresh, not_modified, with_etag
+from src.services.weekly_plan import requested_days
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import or_, and_
 from datetime import datetime
+import base64
+import json
+import os
 
 diet_plans_bp = Blueprint('diet_plans', __name__)
 
+def _budget(value, default):
+    """Orçamento por refeição como número positivo; ValueError se inválido"""
+    if value in (None, ''):
+        value = default
+    if value is None:
+        return None
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        budget = 0.0
+    if not 0 < budget < float('inf'):
+        raise ValueError('budget_per_meal deve ser um número positivo')
+    return budget
+
+def _text(value, default, field):
+    """Campo de texto do perfil (goal, dietary_restrictions); ValueError se não for texto"""
+    if value is None:
+        return default
+    if not isinstance(value, str) or len(value) > 500:
+        raise ValueError(f'{field} deve ser um texto de até 500 caracteres')
+    return value
+
+def _build_user_data(user, data):
+    """
+    Monta os dados enviados para a IA a partir do perfil e da requisição
+    (ValueError se orçamento, objetivo, restrições ou número de dias forem
+    inválidos; chega texto da query string no GET do streaming)
+    """
+    return {
+        'user_id': user.id,
+        'name': user.name,
+        'age': user.age,
+        'weight': user.weight,
+        'height': user.height,
+        'goal': _text(data.get('goal'), user.goal, 'goal'),
+        'budget_per_meal': _budget(data.get('budget_per_meal'), user.budget_per_meal),
+        'dietary_restrictions': _text(data.get('dietary_restrictions'), user.dietary_restrictions,
+                                      'dietary_restrictions'),
+        'days': requested_days(data.get('days'))
+    }
+
+def _wants_async(data):
+    """Verifica se a geração deve ser feita em segundo plano"""
+    flag = request.args.get('async', data.get('async'))
+    if flag is None:
+        return False
+    return str(flag).lower() in ('1', 'true', 'yes')
+
 @diet_plans_bp.route('/generate', methods=['POST'])
 @jwt_required()
 def generate_diet_plan():
     """Gera um novo plano alimentar usando IA"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        identity = current_identity()
+        user_id = identity.id
         
-        if not user or user.user_type != 'user':
+        if not identity.is_user:
             return jsonify({'error': 'Apenas usuários podem gerar planos'}), 403
         
-        data = request.get_json()
+        # O perfil completo só é carregado depois da autorização
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        data = request.get_json(silent=True) or {}
         
         # Dados para a IA
-        user_data = {
-            'name': user.name,
-            'age': user.age,
-            'weight': user.weight,
-            'height': user.height,
-            'goal': data.get('goal', user.goal),
-            'budget_per_meal': data.get('budget_per_meal', user.budget_per_meal),
-            'dietary_restrictions': data.get('dietary_restrictions', user.dietary_restrictions)
-        }
+        try:
+            user_data = _build_user_data(user, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if _wants_async(data):
+            return _enqueue_plan_generation(user_id, user_data)
         
         # Gera plano com IA
         ai_plan = gemini_service.generate_diet_plan(user_data)
@@ -55,30 +117,394 @@ def generate_diet_plan():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Colunas aceitas em ?sort= (prefixo '-' para ordem decrescente)
+SORT_COLUMNS = {
+    'created_at': DietPlan.created_at,
+    'total_cost': DietPlan.total_cost,
+    'total_calories': DietPlan.total_calories
+}
+
+# Filtros numéricos aceitos nas listagens
+RANGE_FILTERS = {
+    'min_cost': (DietPlan.total_cost, '>='),
+    'max_cost': (DietPlan.total_cost, '<='),
+    'min_calories': (DietPlan.total_calories, '>='),
+    'max_calories': (DietPlan.total_calories, '<=')
+}
+
+def _encode_cursor(sort_key, value, plan_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort_key, value, plan_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor, sort_key):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_key, value, plan_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if cursor_key != sort_key:
+            raise ValueError
+        if sort_key == 'created_at':
+            value = datetime.fromisoformat(value)
+        return value, int(plan_id)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+def _apply_plan_filters(query):
+    """Aplica os filtros de custo e calorias (?min_cost=, ?max_calories=, ...)"""
+    for param, (column, operator) in RANGE_FILTERS.items():
+        value = request.args.get(param)
+        if value is None:
+            continue
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f'Parâmetro {param} inválido')
+        query = query.filter(column >= value if operator == '>=' else column <= value)
+    return query
+
+def user_plans_query(user_id):
+    """Planos de um usuário (/my-plans)"""
+    return DietPlan.query.filter_by(user_id=user_id)
+
+def pending_plans_query():
+    """Planos aguardando validação (/pending e /my-plans de nutricionistas)"""
+    return DietPlan.query.filter_by(status='pending')
+
+def _plan_page_queries(query):
+    """
+    Monta as consultas da página a partir de ?limit=, ?cursor=, ?sort=,
+    ?fields= e dos filtros: (versões para o ETag, linhas da página, limite,
+    ordenação, formato). Também usada pelo explain-hot-queries
+    """
+    default_limit = int(os.getenv('PLANS_PAGE_SIZE', 50))
+    max_limit = int(os.getenv('PLANS_PAGE_MAX_SIZE', 200))
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    
+    sort = request.args.get('sort', '-created_at')
+    descending = sort.startswith('-')
+    sort_key = sort.lstrip('-')
+    if sort_key not in SORT_COLUMNS:
+        raise ValueError(f'Ordenação inválida: {sort}')
+    sort_column = SORT_COLUMNS[sort_key]
+    
+    query = _apply_plan_filters(query)
+    if sort_key != 'created_at':
+        # Planos sem totais (em geração) não entram na ordenação por valor
+        query = query.filter(sort_column.isnot(None))
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        value, plan_id = _decode_cursor(cursor, sort_key)
+        if descending:
+            query = query.filter(or_(sort_column < value, and_(sort_column == value, DietPlan.id < plan_id)))
+        else:
+            query = query.filter(or_(sort_column > value, and_(sort_column == value, DietPlan.id > plan_id)))
+    
+    if descending:
+        query = query.order_by(sort_column.desc(), DietPlan.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), DietPlan.id.asc())
+    
+    view = 'summary' if request.args.get('fields') == 'summary' else 'full'
+    versions = query.with_entities(
+        DietPlan.id, DietPlan.updated_at, DietPlan.validated_at, DietPlan.created_at
+    ).limit(limit + 1)
+    if view == 'summary':
+        rows = summary_query(query)
+    else:
+        rows = query.options(*plan_load_options(view))
+    return versions, rows.limit(limit + 1), limit, sort_key, view
+
+def _paginate_plans(query, etag_parts=()):
+    """
+    Paginação por cursor (coluna de ordenação, id) com ?limit=, ?cursor= e
+    ?sort= (created_at, total_cost ou total_calories; '-' para decrescente).
+    Com ?fields=summary seleciona apenas colunas escalares.
+    Retorna (planos serializados, próximo cursor, ETag da página); os planos
+    vêm como None quando o If-None-Match do cliente já corresponde à página.
+    """
+    versions_query, rows_query, limit, sort_key, view = _plan_page_queries(query)
+    
+    # ETag a partir de (id, versão) da página, antes de carregar os planos
+    versions = versions_query.all()
+    etag = make_etag(view, *etag_parts, *[
+        (row.id, DietPlan.version_of(row.updated_at, row.validated_at, row.created_at)) for row in versions
+    ])
+    if is_fresh(etag):
+        return None, None, etag
+    
+    rows = rows_query.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    last = rows[-1] if rows else None
+    next_cursor = _encode_cursor(sort_key, getattr(last, sort_key), last.id) if has_more and last else None
+    return serialize_plans(rows, view), next_cursor, etag
+
+def _sse_event(event, payload):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@diet_plans_bp.route('/generate/stream', methods=['GET', 'POST'])
+@jwt_required()
+def generate_diet_plan_stream():
+    """Gera um plano alimentar enviando cada refeição via SSE assim que fica pronta"""
+    identity = current_identity()
+    user_id = identity.id
+    
+    if not identity.is_user:
+        return jsonify({'error': 'Apenas usuários podem gerar planos'}), 403
+    
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+    
+    data = request.get_json(silent=True) or request.args.to_dict()
+    try:
+        user_data = _build_user_data(user, data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def events():
+        try:
+            for kind, payload in gemini_service.stream_diet_plan(user_data):
+                if kind == 'meal':
+                    meal, meal_data = payload
+                    yield _sse_event('meal', {'meal': meal, 'data': meal_data})
+                    continue
+                if kind == 'day':
+                    day, day_plan = payload
+                    yield _sse_event('day', {'day': day, 'data': day_plan})
+                    continue
+                
+                # Plano completo: salva no banco e encerra o stream
+                diet_plan = DietPlan(
+                    user_id=user_id,
+                    goal=user_data['goal'],
+                    budget_per_meal=user_data['budget_per_meal'],
+                    dietary_restrictions=user_data['dietary_restrictions'],
+                    status='pending'
+                )
+                diet_plan.set_ai_plan(payload)
+                
+                db.session.add(diet_plan)
+                db.session.commit()
+                
+                yield _sse_event('done', {
+                    'message': 'Plano gerado com sucesso',
+                    'diet_plan': diet_plan.to_dict()
+                })
+        
+        except Exception as e:
+            db.session.rollback()
+            yield _sse_event('error', {'error': str(e)})
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _enqueue_plan_generation(user_id, user_data):
+    """Cria o plano em estado 'generating' e delega a chamada da IA para a fila"""
+    diet_plan = DietPlan(
+        user_id=user_id,
+        goal=user_data['goal'],
+        budget_per_meal=user_data['budget_per_meal'],
+        dietary_restrictions=user_data['dietary_restrictions'],
+        status='generating'
+    )
+    diet_plan.set_ai_plan({})
+    
+    db.session.add(diet_plan)
+    db.session.commit()
+    
+    if not plan_job_queue.submit(current_app._get_current_object(), diet_plan.id, user_data):
+        db.session.delete(diet_plan)
+        db.session.commit()
+        return jsonify({'error': 'Fila de geração cheia, tente novamente em instantes'}), 503
+    
+    status_url = url_for('diet_plans.get_plan_status', plan_id=diet_plan.id)
+    response = jsonify({
+        'message': 'Geração do plano iniciada',
+        'job_id': diet_plan.id,
+        'status': diet_plan.status,
+        'status_url': status_url
+    })
+    response.headers['Location'] = status_url
+    response.headers['Retry-After'] = '2'
+    return response, 202
+
+@diet_plans_bp.route('/<int:plan_id>/status', methods=['GET'])
+@jwt_required()
+def get_plan_status(plan_id):
+    """Retorna o andamento da geração de um plano"""
+    try:
+        user_id = current_identity().id
+        
+        plan = DietPlan.query.get(plan_id)
+        
+        if not plan or plan.user_id != user_id:
+            return jsonify({'error': 'Plano não encontrado'}), 404
+        
+        # Job perdido (worker morto ou processo reiniciado): deixa de aparecer como em andamento
+        if plan_job_queue.is_stale(plan) and plan_job_queue.expire_stale([plan.id]):
+            db.session.refresh(plan)
+        
+        response = {
+            'job_id': plan.id,
+            'status': plan.status,
+            'ready': plan.status not in ('generating', 'failed'),
+            'created_at': plan.created_at.isoformat() if plan.created_at else None
+        }
+        if plan.status == 'failed':
+            response['error'] = plan.get_ai_plan().get('error')
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _batch_user_id(item):
+    """user_id inteiro de um item do lote (None se o item ou o id forem inválidos)"""
+    user_id = item.get('user_id') if isinstance(item, dict) else None
+    if isinstance(user_id, bool) or not isinstance(user_id, int):
+        return None
+    return user_id
+
+@diet_plans_bp.route('/generate-batch', methods=['POST'])
+@jwt_required()
+def generate_diet_plans_batch():
+    """Gera planos para vários pacientes de uma vez (chamadas à IA em paralelo)"""
+    try:
+        identity = current_identity()
+        user_id = identity.id
+        
+        if not identity.is_nutritionist:
+            return jsonify({'error': 'Apenas nutricionistas podem gerar planos em lote'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        
+        # Aceita uma lista de ids ou de perfis com campos a sobrescrever
+        user_ids, profiles = data.get('user_ids', []), data.get('profiles', [])
+        if not isinstance(user_ids, list) or not isinstance(profiles, list):
+            return jsonify({'error': 'user_ids e profiles devem ser listas'}), 400
+        items = [{'user_id': uid} for uid in user_ids] + profiles
+        
+        if not items:
+            return jsonify({'error': 'Informe user_ids ou profiles'}), 400
+        
+        max_items = int(os.getenv('PLAN_BATCH_MAX_ITEMS', 200))
+        if len(items) > max_items:
+            return jsonify({'error': f'Máximo de {max_items} itens por lote'}), 400
+        
+        max_concurrency = int(os.getenv('PLAN_BATCH_MAX_CONCURRENCY', 8))
+        try:
+            concurrency = int(data.get('max_concurrency', max_concurrency))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'max_concurrency inválido'}), 400
+        concurrency = max(1, min(concurrency, max_concurrency, len(items)))
+        
+        # Carrega todos os pacientes em uma única consulta
+        item_ids = [_batch_user_id(item) for item in items]
+        ids = {uid for uid in item_ids if uid is not None}
+        patients = {p.id: p for p in User.query.filter(User.id.in_(ids), User.user_type == 'user').all()}
+        
+        results = [None] * len(items)
+        jobs = []
+        for index, item in enumerate(items):
+            if item_ids[index] is None:
+                raw_id = item.get('user_id') if isinstance(item, dict) else None
+                results[index] = {'index': index, 'user_id': raw_id, 'error': 'user_id deve ser um número inteiro'}
+                continue
+            patient = patients.get(item_ids[index])
+            if not patient:
+                results[index] = {'index': index, 'user_id': item_ids[index], 'error': 'Usuário não encontrado'}
+                continue
+            try:
+                jobs.append((index, patient.id, _build_user_data(patient, item)))
+            except ValueError as e:
+                results[index] = {'index': index, 'user_id': patient.id, 'error': str(e)}
+        
+        app = current_app._get_current_object()
+        
+        def run(user_data):
+            with app.app_context():
+                return gemini_service.generate_diet_plan(user_data)
+        
+        # Fan-out limitado: o tempo total escala com a concorrência, não com N
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [(index, patient_id, user_data, executor.submit(run, user_data))
+                       for index, patient_id, user_data in jobs]
+        
+        new_plans = []
+        for index, patient_id, user_data, future in futures:
+            try:
+                ai_plan = future.result()
+            except Exception as e:
+                results[index] = {'index': index, 'user_id': patient_id, 'error': str(e)}
+                continue
+            
+            diet_plan = DietPlan(
+                user_id=patient_id,
+                goal=user_data['goal'],
+                budget_per_meal=user_data['budget_per_meal'],
+                dietary_restrictions=user_data['dietary_restrictions'],
+                status='pending'
+            )
+            diet_plan.set_ai_plan(ai_plan)
+            new_plans.append((index, diet_plan))
+        
+        # Um único flush insere todas as linhas em lote
+        db.session.add_all([plan for _, plan in new_plans])
+        db.session.commit()
+        
+        for index, diet_plan in new_plans:
+            results[index] = {'index': index, 'user_id': diet_plan.user_id, 'plan_id': diet_plan.id, 'status': diet_plan.status}
+        
+        errors = sum(1 for result in results if 'error' in result)
+        
+        return jsonify({
+            'message': f'{len(new_plans)} planos gerados, {errors} com erro',
+            'results': results,
+            'created': len(new_plans),
+            'errors': errors,
+            'concurrency': concurrency
+        }), 201 if new_plans else 400
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @diet_plans_bp.route('/my-plans', methods=['GET'])
 @jwt_required()
 def get_my_plans():
     """Retorna planos do usuário atual"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        identity = current_identity()
+        user_id = identity.id
         
-        if user.user_type == 'user':
+        if identity.is_user:
             # Usuário vê seus próprios planos
-            plans = DietPlan.query.filter_by(user_id=user_id).order_by(DietPlan.created_at.desc()).all()
-        elif user.user_type == 'nutritionist':
+            query = user_plans_query(user_id)
+        elif identity.is_nutritionist:
             # Nutricionista vê planos pendentes para validar
-            plans = DietPlan.query.filter_by(status='pending').order_by(DietPlan.created_at.desc()).all()
+            query = pending_plans_query()
         else:
             return jsonify({'error': 'Tipo de usuário inválido'}), 403
         
-        return jsonify({
-            'plans': [plan.to_dict() for plan in plans]
-        }), 200
+        plans, next_cursor, etag = _paginate_plans(query)
+        if plans is None:
+            return not_modified(etag)
+        
+        return with_etag(jsonify({
+            'plans': plans,
+            'next_cursor': next_cursor
+        }), etag), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -87,39 +513,59 @@ def get_my_plans():
 def get_plan_details(plan_id):
     """Retorna detalhes de um plano específico"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        identity = current_identity()
+        user_id = identity.id
         
-        plan = DietPlan.query.get(plan_id)
+        # Só as colunas de permissão e versão; o plano completo é carregado se mudou
+        meta = db.session.query(
+            DietPlan.user_id, DietPlan.nutritionist_id, DietPlan.status,
+            DietPlan.updated_at, DietPlan.validated_at, DietPlan.created_at
+        ).filter(DietPlan.id == plan_id).first()
         
-        if not plan:
+        if not meta:
             return jsonify({'error': 'Plano não encontrado'}), 404
         
         # Verifica permissões
-        if user.user_type == 'user' and plan.user_id != user_id:
+        if identity.is_user and meta.user_id != user_id:
             return jsonify({'error': 'Acesso negado'}), 403
-        elif user.user_type == 'nutritionist' and plan.status != 'pending':
+        elif identity.is_nutritionist and meta.status != 'pending':
             # Nutricionista só pode ver planos pendentes ou que ele validou
-            if plan.nutritionist_id != user_id:
+            if meta.nutritionist_id != user_id:
                 return jsonify({'error': 'Acesso negado'}), 403
         
-        return jsonify({'plan': plan.to_dict()}), 200
+        etag = make_etag(plan_id, DietPlan.version_of(meta.updated_at, meta.validated_at, meta.created_at))
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        plan = plan_query().get(plan_id)
+        return with_etag(jsonify({'plan': plan.to_dict()}), etag), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _index_approved_plan(plan):
+    """
+    Inclui o plano aprovado no índice de reaproveitamento; a aprovação já
+    foi gravada, então uma falha aqui só adia a inclusão para a próxima releitura
+    """
+    from src.services.plan_index import approved_plan_index
+    
+    try:
+        approved_plan_index.add_plan(plan)
+    except Exception as e:
+        print(f"⚠️ Plano {plan.id} aprovado fora do índice de reaproveitamento: {e}")
+        approved_plan_index.invalidate()
+
 @diet_plans_bp.route('/<int:plan_id>/validate', methods=['POST'])
 @jwt_required()
 def validate_plan(plan_id):
     """Valida um plano (aprovar ou rejeitar)"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        identity = current_identity()
+        user_id = identity.id
         
-        if not user or user.user_type != 'nutritionist':
+        if not identity.is_nutritionist:
             return jsonify({'error': 'Apenas nutricionistas podem validar planos'}), 403
         
         plan = DietPlan.query.get(plan_id)
@@ -137,13 +583,22 @@ def validate_plan(plan_id):
         if action not in ['approve', 'reject']:
             return jsonify({'error': 'Ação deve ser approve ou reject'}), 400
         
-        # Atualiza plano
-        plan.status = 'approved' if action == 'approve' else 'rejected'
+        # Reserva o plano com UPDATE condicional: em validações simultâneas só
+        # uma muda a linha e conta na consolidação de estatísticas
+        status = 'approved' if action == 'approve' else 'rejected'
+        claimed = DietPlan.query.filter_by(id=plan_id, status='pending').update({'status': status})
+        if claimed != 1:
+            db.session.rollback()
+            return jsonify({'error': 'Plano já foi validado'}), 400
+        
+        record_validation(user_id, plan.user_id, status)
         plan.nutritionist_id = user_id
         plan.nutritionist_feedback = feedback
         plan.validated_at = datetime.utcnow()
         
         db.session.commit()
+        if status == 'approved':
+            _index_approved_plan(plan)
         
         return jsonify({
             'message': f'Plano {"aprovado" if action == "approve" else "rejeitado"} com sucesso',
@@ -159,19 +614,26 @@ def validate_plan(plan_id):
 def get_pending_plans():
     """Retorna planos pendentes para nutricionistas"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        identity = current_identity()
+        user_id = identity.id
         
-        if not user or user.user_type != 'nutritionist':
+        if not identity.is_nutritionist:
             return jsonify({'error': 'Apenas nutricionistas podem acessar'}), 403
         
-        plans = DietPlan.query.filter_by(status='pending').order_by(DietPlan.created_at.desc()).all()
+        query = pending_plans_query()
+        count = query.count()
+        plans, next_cursor, etag = _paginate_plans(query, etag_parts=(count,))
+        if plans is None:
+            return not_modified(etag)
         
-        return jsonify({
-            'pending_plans': [plan.to_dict() for plan in plans],
-            'count': len(plans)
-        }), 200
+        return with_etag(jsonify({
+            'pending_plans': plans,
+            'count': count,
+            'next_cursor': next_cursor
+        }), etag), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -180,34 +642,16 @@ def get_pending_plans():
 def get_nutritionist_stats():
     """Retorna estatísticas para nutricionistas"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        identity = current_identity()
+        user_id = identity.id
         
-        if not user or user.user_type != 'nutritionist':
+        if not identity.is_nutritionist:
             return jsonify({'error': 'Apenas nutricionistas podem acessar'}), 403
         
-        # Estatísticas
-        total_validated = DietPlan.query.filter_by(nutritionist_id=user_id).count()
-        approved = DietPlan.query.filter_by(nutritionist_id=user_id, status='approved').count()
-        rejected = DietPlan.query.filter_by(nutritionist_id=user_id, status='rejected').count()
-        pending = DietPlan.query.filter_by(status='pending').count()
-        
-        # Pacientes únicos
-        unique_patients = db.session.query(DietPlan.user_id).filter_by(nutritionist_id=user_id).distinct().count()
-        
-        # Taxa de aprovação
-        approval_rate = (approved / total_validated * 100) if total_validated > 0 else 0
+        # Estatísticas (consulta agregada única ou consolidação pré-calculada)
+        stats = format_stats(read_stats(user_id))
         
-        return jsonify({
-            'stats': {
-                'total_validated': total_validated,
-                'approved': approved,
-                'rejected': rejected,
-                'pending': pending,
-                'unique_patients': unique_patients,
-                'approval_rate': round(approval_rate, 1)
-            }
-        }), 200
+        return jsonify({'stats': stats}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,65 @@
+import io
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from src.models.nutriai_models import db
+from src.routes.admin_auth import is_admin_request
+from src.services.price_ingestion import detect_format, ingest_prices, FORMATS
+
+food_prices_bp = Blueprint('food_prices', __name__)
+
+@food_prices_bp.route('/import', methods=['POST'])
+def import_food_prices():
+    """
+    Importa preços em massa (CSV ou NDJSON) com upsert por
+    (food_name, supermarket, location). Aceita o arquivo no corpo da
+    requisição ou em multipart (campo "file").
+    """
+    try:
+        if not is_admin_request():
+            return jsonify({'error': 'Acesso negado'}), 403
+
+        upload = request.files.get('file')
+        if upload is not None:
+            raw, filename, content_type = upload.stream, upload.filename, upload.mimetype
+        else:
+            raw, filename, content_type = request.stream, None, request.mimetype
+
+        fmt = request.args.get('format') or detect_format(filename, content_type)
+        if fmt not in FORMATS:
+            return jsonify({'error': f'Formato inválido: {fmt}'}), 400
+
+        # Leitura em streaming: o arquivo não é carregado inteiro na memória
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        batch_size = request.args.get('batch_size', type=int)
+        report = ingest_prices(db.engine, stream, fmt, batch_size=batch_size, log=lambda message: None)
+
+        return jsonify({
+            'message': f"{report['rows']} preços importados",
+            'report': report
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@food_prices_bp.route('/lookup', methods=['GET'])
+@jwt_required()
+def lookup_food_prices():
+    """
+    Preços dos alimentos com nome mais parecido com q (sem acentos e
+    tolerante a erros de digitação), opcionalmente filtrados por location
+    """
+    # Import tardio: o índice carrega o NumPy, fora da inicialização da aplicação
+    from src.services.food_index import food_name_index
+
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+
+        k = min(max(request.args.get('k', 5, type=int), 1), 50)
+        results = food_name_index.lookup(query, location=request.args.get('location'), k=k)
+        return jsonify({'query': query, 'results': results}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,153 @@
+"""
+Modelo falso com a mesma interface usada do Gemini (generate_content), com
+latência e falhas configuráveis. Usado em desenvolvimento e nos benchmarks
+de resiliência (GEMINI_FAKE_MODEL=1), sem chave nem rede.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+FAKE_PLAN = {
+    'breakfast': {
+        'description': 'Pão integral com ovos mexidos e banana',
+        'foods': ['Pão integral (2 fatias)', 'Ovos (2 unidades)', 'Banana (1 unidade)'],
+        'preparation': 'Preparar os ovos mexidos e servir com o pão e a fruta',
+        'estimated_cost': 5.5, 'calories': 450, 'macros': {'protein': 22, 'carbs': 55, 'fat': 14}
+    },
+    'lunch': {
+        'description': 'Frango grelhado com arroz, feijão e salada',
+        'foods': ['Peito de frango (150g)', 'Arroz branco (150g)', 'Feijão carioca (100g)', 'Alface (50g)'],
+        'preparation': 'Grelhar o frango; cozinhar arroz e feijão; montar a salada',
+        'estimated_cost': 12.0, 'calories': 650, 'macros': {'protein': 50, 'carbs': 75, 'fat': 12}
+    },
+    'dinner': {
+        'description': 'Omelete de legumes com batata doce',
+        'foods': ['Ovos (3 unidades)', 'Batata doce (150g)', 'Brócolis (100g)'],
+        'preparation': 'Preparar a omelete com os legumes e cozinhar a batata doce',
+        'estimated_cost': 8.0, 'calories': 480, 'macros': {'protein': 26, 'carbs': 45, 'fat': 18}
+    },
+    'snack': {
+        'description': 'Iogurte natural com aveia',
+        'foods': ['Iogurte natural (170g)', 'Aveia (30g)'],
+        'preparation': 'Misturar a aveia ao iogurte',
+        'estimated_cost': 4.0, 'calories': 220, 'macros': {'protein': 10, 'carbs': 30, 'fat': 6}
+    },
+    'total_cost': 29.5,
+    'total_calories': 1800,
+    'total_macros': {'protein': 108, 'carbs': 205, 'fat': 50},
+    'nutritionist_notes': 'Plano de exemplo gerado pelo modelo falso.'
+}
+
+
+class ResourceExhausted(Exception):
+    """Mesmo nome do erro 429 do SDK"""
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    generate_content com atraso = latency ± jitter; com probabilidade
+    failure_rate levanta erro e com hang_rate demora hang_seconds (upstream travado);
+    acima de rpm chamadas por minuto responde 429 (ResourceExhausted); com
+    malformed_rate devolve JSON com defeito (cortado, com texto em volta ou
+    vírgulas sobrando)
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, failure_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang_seconds: float = 60.0, rpm: float = 0, quota_window: float = 60.0,
+                 malformed_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.rpm = rpm
+        self.quota_window = quota_window
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'FakeGeminiModel':
+        return cls(
+            latency=float(os.getenv('GEMINI_FAKE_LATENCY_MS', 500)) / 1000,
+            jitter=float(os.getenv('GEMINI_FAKE_JITTER_MS', 200)) / 1000,
+            failure_rate=float(os.getenv('GEMINI_FAKE_FAILURE_RATE', 0)),
+            hang_rate=float(os.getenv('GEMINI_FAKE_HANG_RATE', 0)),
+            hang_seconds=float(os.getenv('GEMINI_FAKE_HANG_SECONDS', 60)),
+            rpm=float(os.getenv('GEMINI_FAKE_RPM', 0)),
+            malformed_rate=float(os.getenv('GEMINI_FAKE_MALFORMED_RATE', 0))
+        )
+
+    def _check_quota(self):
+        if not self.rpm:
+            return
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > self.quota_window:
+                self._recent.popleft()
+            if len(self._recent) >= self.rpm * self.quota_window / 60.0:
+                self.throttled += 1
+                raise ResourceExhausted('429 Resource has been exhausted (e.g. check quota).')
+            self._recent.append(now)
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+        if roll < self.hang_rate:
+            return self.hang_seconds, False
+        return delay, roll < self.hang_rate + self.failure_rate
+
+    def generate_content(self, prompt: str, stream: bool = False, request_options: Dict[str, Any] = None, **kwargs):
+        self._check_quota()
+        delay, fail = self._draw()
+        timeout = (request_options or {}).get('timeout')
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('Tempo limite do modelo falso excedido')
+
+        text = self._response_text(kwargs.get('generation_config'))
+        if not stream:
+            time.sleep(delay)
+            if fail:
+                raise RuntimeError('Falha simulada do modelo falso')
+            return FakeResponse(text)
+        return self._stream(text, delay, fail)
+
+    def _response_text(self, generation_config: Dict[str, Any] = None) -> str:
+        # Com response_schema, só as refeições pedidas (como o modelo real)
+        schema = (generation_config or {}).get('response_schema') or {}
+        plan = {key: FAKE_PLAN[key] for key in schema.get('properties', FAKE_PLAN) if key in FAKE_PLAN}
+        text = json.dumps(plan, ensure_ascii=False, indent=2)
+        with self._lock:
+            if self._random.random() >= self.malformed_rate:
+                return text
+            defect = self._random.choice(('truncated', 'prose', 'trailing_comma'))
+        if defect == 'truncated':
+            return text[:int(len(text) * 0.55)]
+        if defect == 'prose':
+            return f"Claro! Aqui está o plano:\n```json\n{text}\n```\nBom apetite!"
+        return text.replace('\n  }', ',\n  }')
+
+    @staticmethod
+    def _stream(text: str, delay: float, fail: bool):
+        pieces = 8
+        size = len(text) // pieces + 1
+        for i in range(pieces):
+            time.sleep(delay / pieces)
+            if fail and i == pieces // 2:
+                raise RuntimeError('Falha simulada do modelo falso')
+            yield FakeResponse(text[i * size:(i + 1) * size])
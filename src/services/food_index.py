@@ -0,0 +1,315 @@
+"""
+Índice em memória dos nomes de food_prices para busca aproximada.
+
+Os nomes são normalizados (sem acentos, minúsculas) e decompostos em
+trigramas; as listas de ocorrência ficam em arrays NumPy (formato CSR) e
+a similaridade (Jaccard de trigramas) de todos os nomes é calculada com
+um único bincount por consulta. Linhas novas ou alteradas entram pelo
+updated_at, sem recarregar a tabela.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.services.nutrition import normalize_name, parse_food
+
+# Palavras de ligação não entram nos trigramas ("castanha do pará")
+STOP_WORDS = {'de', 'do', 'da', 'dos', 'das', 'e', 'com'}
+
+# Listas pendentes acima deste tamanho disparam a reconstrução do CSR
+DELTA_REBUILD_SIZE = 5000
+
+
+def trigrams(name: str) -> set:
+    """Trigramas de cada palavra, com as bordas marcadas (como o pg_trgm)"""
+    grams = set()
+    for word in name.split():
+        if word in STOP_WORDS:
+            continue
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FoodNameIndex:
+    def __init__(self, refresh_interval: float = None, full_refresh_interval: float = None):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            float(os.getenv('FOOD_INDEX_REFRESH_SECONDS', 30))
+        self.full_refresh_interval = full_refresh_interval if full_refresh_interval is not None else \
+            float(os.getenv('FOOD_INDEX_FULL_REFRESH_SECONDS', 3600))
+        self.overlap = timedelta(seconds=float(os.getenv('FOOD_INDEX_OVERLAP_SECONDS', 5)))
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        self.name_ids: Dict[str, int] = {}
+        self.name_rows: List[set] = []
+        self.rows: Dict[int, Tuple] = {}
+        self.vocab: Dict[str, int] = {}
+
+        # CSR: ocorrências do trigrama t em postings[indptr[t]:indptr[t + 1]]
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+        self.sizes = np.zeros(0, dtype=np.float32)
+        self._sizes_list: List[int] = []
+        self.delta: Dict[int, List[int]] = {}
+        self._delta_size = 0
+
+        self.last_seen: Optional[datetime] = None
+        self.synced_at: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self.full_loaded_at = 0.0
+        self._row_arrays = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.full_loaded_at > 0
+
+    # Construção
+
+    def _add_name(self, label: str) -> int:
+        name = normalize_name(label)
+        name_id = self.name_ids.get(name)
+        if name_id is not None:
+            return name_id
+
+        name_id = len(self.names)
+        self.names.append(name)
+        self.labels.append(label)
+        self.name_ids[name] = name_id
+        self.name_rows.append(set())
+
+        grams = trigrams(name)
+        self._sizes_list.append(len(grams))
+        for gram in grams:
+            gram_id = self.vocab.setdefault(gram, len(self.vocab))
+            self.delta.setdefault(gram_id, []).append(name_id)
+        self._delta_size += len(grams)
+        return name_id
+
+    def add_rows(self, rows: Iterable[Tuple]):
+        """Insere ou atualiza linhas (id, food_name, price_per_unit, unit, supermarket, location, updated_at)"""
+        locations = {}
+        changed = False
+        for row_id, food_name, price, unit, supermarket, location, updated_at in rows:
+            if updated_at is not None and (self.last_seen is None or updated_at > self.last_seen):
+                self.last_seen = updated_at
+            name_id = self._add_name(food_name)
+            normalized_location = locations.get(location)
+            if normalized_location is None:
+                normalized_location = locations[location] = normalize_name(location)
+            row = (name_id, price, unit, supermarket or '', location or '', normalized_location)
+            previous = self.rows.get(row_id)
+            if previous == row:
+                continue
+            if previous is not None and previous[0] != name_id:
+                self.name_rows[previous[0]].discard(row_id)
+            self.rows[row_id] = row
+            self.name_rows[name_id].add(row_id)
+            changed = True
+
+        if len(self.sizes) != len(self._sizes_list):
+            self.sizes = np.array(self._sizes_list, dtype=np.float32)
+        if changed:
+            self._row_arrays = None
+        if self._delta_size > DELTA_REBUILD_SIZE:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Junta as listas pendentes ao CSR"""
+        gram_ids, name_ids = [], []
+        for gram_id in range(len(self.indptr) - 1):
+            start, end = self.indptr[gram_id], self.indptr[gram_id + 1]
+            if end > start:
+                gram_ids.append(np.full(end - start, gram_id, dtype=np.int64))
+                name_ids.append(self.postings[start:end])
+        for gram_id, members in self.delta.items():
+            gram_ids.append(np.full(len(members), gram_id, dtype=np.int64))
+            name_ids.append(np.array(members, dtype=np.int32))
+
+        if gram_ids:
+            gram_ids = np.concatenate(gram_ids)
+            name_ids = np.concatenate(name_ids)
+            order = np.argsort(gram_ids, kind='stable')
+            self.postings = name_ids[order].astype(np.int32)
+            counts = np.bincount(gram_ids, minlength=len(self.vocab))
+            self.indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.delta = {}
+        self._delta_size = 0
+
+    # Sincronização com o banco
+
+    def refresh(self, full: bool = False) -> int:
+        """Carrega as linhas alteradas desde a última sincronização (ou a tabela toda)"""
+        from src.models.nutriai_models import FoodPrice
+
+        full = full or not self.loaded or time.monotonic() - self.full_loaded_at > self.full_refresh_interval
+        started = datetime.utcnow()
+        query = FoodPrice.query.with_entities(
+            FoodPrice.id, FoodPrice.food_name, FoodPrice.price_per_unit, FoodPrice.unit,
+            FoodPrice.supermarket, FoodPrice.location, FoodPrice.updated_at
+        ).order_by(FoodPrice.id)
+
+        if full:
+            # Monta um índice novo fora do lock e troca de uma vez (remoções inclusas)
+            fresh = FoodNameIndex(self.refresh_interval, self.full_refresh_interval)
+            count = 0
+            for batch in _batches(query.yield_per(5000), 5000):
+                fresh.add_rows(batch)
+                count += len(batch)
+            fresh._rebuild()
+            fresh.synced_at = started
+            fresh.full_loaded_at = fresh.refreshed_at = time.monotonic()
+            with self._lock:
+                for key, value in vars(fresh).items():
+                    if key not in ('_lock', '_refresh_lock'):
+                        setattr(self, key, value)
+            return count
+
+        # Janela de sobreposição: transações confirmadas depois da última
+        # sincronização, mas com updated_at anterior a ela, não se perdem
+        query = query.filter(FoodPrice.updated_at > self.synced_at - self.overlap)
+        rows = [tuple(row) for row in query.all()]
+        with self._lock:
+            self.add_rows(rows)
+            self.synced_at = started
+            self.refreshed_at = time.monotonic()
+        return len(rows)
+
+    def refresh_if_due(self):
+        """Sincroniza a cada FOOD_INDEX_REFRESH_SECONDS; só uma thread por vez"""
+        if time.monotonic() - self.refreshed_at < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if time.monotonic() - self.refreshed_at >= self.refresh_interval:
+                self.refresh()
+        except Exception as e:
+            # Sem contexto de aplicação ou tabela ainda não criada
+            print(f"⚠️ Índice de alimentos não atualizado: {e}")
+            self.refreshed_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self):
+        """Força a sincronização na próxima consulta (ex.: após uma importação)"""
+        self.refreshed_at = 0.0
+
+    # Consultas
+
+    def search(self, text: str, k: int = 10, min_score: float = None) -> List[Tuple[int, float]]:
+        """Os k nomes mais parecidos: [(id do nome, similaridade de 0 a 1)]"""
+        min_score = min_score if min_score is not None else float(os.getenv('FOOD_INDEX_MIN_SCORE', 0.3))
+        with self._lock:
+            return self._search(text, k, min_score)
+
+    def _search(self, text: str, k: int, min_score: float) -> List[Tuple[int, float]]:
+        parsed = parse_food(text)
+        query = parsed[0] if parsed else normalize_name(text)
+        grams = [self.vocab.get(gram) for gram in trigrams(query)]
+        n_names = len(self.names)
+        if not n_names or not grams:
+            return []
+
+        main_grams = len(self.indptr) - 1
+        lists = [self.postings[self.indptr[g]:self.indptr[g + 1]] for g in grams if g is not None and g < main_grams]
+        hits = np.bincount(np.concatenate(lists), minlength=n_names) if lists else np.zeros(n_names, dtype=np.int64)
+        for gram_id in grams:
+            for name_id in self.delta.get(gram_id, ()):
+                hits[name_id] += 1
+
+        # Jaccard >= min_score exige ao menos min_score * len(grams) trigramas em comum
+        needed = max(1, math.ceil(min_score * len(grams)))
+        candidates = np.flatnonzero(hits >= needed)
+        shared = hits[candidates]
+        if not len(candidates):
+            return []
+        scores = shared / (len(grams) + self.sizes[candidates] - shared)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(candidates[i]), float(scores[i])) for i in top if scores[i] >= min_score]
+
+    def lookup(self, text: str, location: Optional[str] = None, k: int = 5,
+               min_score: float = None) -> List[Dict[str, Any]]:
+        """
+        Preços mais próximos do nome (e do local, se informado), ordenados por
+        similaridade e depois por preço
+        """
+        self.refresh_if_due()
+        min_score = min_score if min_score is not None else float(os.getenv('FOOD_INDEX_MIN_SCORE', 0.3))
+        wanted = normalize_name(location) if location else None
+
+        results = []
+        with self._lock:
+            for name_id, score in self._search(text, max(k * 4, 20), min_score):
+                for row_id in self.name_rows[name_id]:
+                    _, price, unit, supermarket, row_location, normalized_location = self.rows[row_id]
+                    if wanted and normalized_location != wanted:
+                        continue
+                    results.append({
+                        'id': row_id,
+                        'food_name': self.labels[name_id],
+                        'price_per_unit': price,
+                        'unit': unit,
+                        'supermarket': supermarket,
+                        'location': row_location,
+                        'score': round(score, 3)
+                    })
+        results.sort(key=lambda item: (-item['score'], item['price_per_unit']))
+        return results[:k]
+
+    def row_arrays(self) -> Dict[str, Any]:
+        """
+        Linhas em arrays para cálculos em lote: id do nome, preço e códigos de
+        unidade e local (os valores ficam em 'units' e 'locations')
+        """
+        with self._lock:
+            if self._row_arrays is None:
+                rows = list(self.rows.values())
+                units, locations = {}, {}
+                self._row_arrays = {
+                    'names': list(self.names),
+                    'name_id': np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+                    'price': np.fromiter((row[1] or 0.0 for row in rows), dtype=np.float64, count=len(rows)),
+                    'unit': np.fromiter((units.setdefault(row[2], len(units)) for row in rows),
+                                        dtype=np.int64, count=len(rows)),
+                    'location': np.fromiter((locations.setdefault(row[5], len(locations)) for row in rows),
+                                            dtype=np.int64, count=len(rows)),
+                    'units': list(units),
+                    'locations': list(locations),
+                }
+            return self._row_arrays
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rows': len(self.rows),
+                'names': len(self.names),
+                'trigrams': len(self.vocab),
+                'pending_postings': self._delta_size,
+                'last_seen': self.last_seen.isoformat() if self.last_seen else None
+            }
+
+
+def _batches(rows: Iterable, size: int):
+    batch = []
+    for row in rows:
+        batch.append(tuple(row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+food_name_index = FoodNameIndex()
@@ -1,41 +1,352 @@
-import google.generativeai as genai
 import os
-import json
-from typing import Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, Tuple
+from flask import current_app, has_app_context
+from src.services.plan_cache import PlanCache, make_cache_key
+from src.services.json_stream import IncrementalObjectParser
+from src.services.plan_repair import MEAL_KEYS, MEAL_NAMES, ParseStats, decode_plan, plan_schema, recompute_totals
+from src.services.quota_scheduler import QuotaScheduler
+from src.services.resilience import DeadlineExceeded, ResilientCaller, UpstreamUnavailable
+from src.services.weekly_plan import day_theme, merge_days, used_foods
+
+_UNSET = object()
 
 class GeminiService:
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
-        if self.api_key and self.api_key != 'your_gemini_api_key_here':
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.model = None
+        self.model_name = os.getenv('GEMINI_MODEL', 'gemini-pro')
+        self._model = _UNSET
+        self._model_lock = threading.Lock()
+        
+        self.cache = PlanCache()
+        self.resilience = ResilientCaller('gemini')
+        self.quota = QuotaScheduler()
+        self.parse_stats = ParseStats()
+    
+    @property
+    def model(self):
+        """Cliente do Gemini, criado no primeiro uso (evita importar o SDK na inicialização)"""
+        if self._model is _UNSET:
+            with self._model_lock:
+                if self._model is _UNSET:
+                    self._model = self._create_model()
+        return self._model
+    
+    @model.setter
+    def model(self, value):
+        self._model = value
+    
+    def _create_model(self):
+        if os.getenv('GEMINI_FAKE_MODEL', '0') == '1':
+            from src.services.fake_gemini import FakeGeminiModel
+            
+            print("🧪 GEMINI_FAKE_MODEL ativo: usando o modelo falso local.")
+            return FakeGeminiModel.from_env()
+        
+        if not self.api_key or self.api_key == 'your_gemini_api_key_here':
             print("⚠️ GEMINI_API_KEY não configurada. Usando modo simulado.")
+            return None
+        
+        import google.generativeai as genai
+        
+        genai.configure(api_key=self.api_key)
+        return genai.GenerativeModel(self.model_name)
+    
+    @property
+    def structured_output(self) -> bool:
+        """Resposta em JSON com schema (GEMINI_STRUCTURED_OUTPUT); os modelos 1.0 não suportam"""
+        return (
+            os.getenv('GEMINI_STRUCTURED_OUTPUT', '1') == '1'
+            and not self.model_name.startswith(('gemini-pro', 'gemini-1.0'))
+        )
+    
+    def _call_model(self, prompt: str, timeout: float, meals=MEAL_KEYS, stream: bool = False):
+        """generate_content com prazo e, quando suportado, o schema das refeições pedidas"""
+        kwargs = {'request_options': {'timeout': timeout}}
+        if self.structured_output:
+            kwargs['generation_config'] = {
+                'response_mime_type': 'application/json',
+                'response_schema': plan_schema(meals, totals=tuple(meals) == MEAL_KEYS)
+            }
+        return self.model.generate_content(prompt, stream=stream, **kwargs)
+    
+    @property
+    def use_gemini(self) -> bool:
+        """False com PLAN_GENERATOR=local ou sem chave do Gemini (planos pelo otimizador local)"""
+        from src.services.meal_optimizer import local_generator_enabled
+        
+        return not local_generator_enabled() and bool(self.model)
     
     def generate_diet_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Gera um plano alimentar personalizado usando Gemini AI
         """
-        if not self.model:
+        if (user_data.get('days') or 1) > 1:
+            return self.generate_multi_day_plan(user_data)
+        
+        if not self.use_gemini:
+            return self._generate_mock_plan(user_data)
+        
+        # Perfis equivalentes reaproveitam o plano já gerado
+        cache_key = make_cache_key(user_data)
+        cached_plan = self.cache.get(cache_key)
+        if cached_plan is not None:
+            return cached_plan
+        
+        # Plano aprovado de um perfil quase igual dispensa a chamada à IA
+        approved_plan = self._find_approved_plan(user_data)
+        if approved_plan is not None:
+            return approved_plan
+        
+        if not self._acquire_quota(user_data):
             return self._generate_mock_plan(user_data)
         
         try:
             prompt = self._create_diet_prompt(user_data)
-            response = self.model.generate_content(prompt)
+            response = self.resilience.call(lambda timeout: self._call_model(prompt, timeout))
+            self.quota.observe()
             
-            # Processa a resposta da IA
-            plan = self._parse_ai_response(response.text, user_data)
+            # Processa a resposta da IA (apenas respostas válidas vão para o cache)
+            plan = self._with_local_nutrition(self._decode_ai_response(response.text, user_data))
+            self.cache.set(cache_key, plan)
             return plan
             
+        except UpstreamUnavailable:
+            # Gemini degradado: vai direto ao plano local, sem esperar o prazo
+            return self._generate_mock_plan(user_data)
         except Exception as e:
             print(f"Erro ao gerar plano com Gemini: {e}")
+            self.quota.observe(e)
             return self._generate_mock_plan(user_data)
     
-    def _create_diet_prompt(self, user_data: Dict[str, Any]) -> str:
+    def generate_multi_day_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Cria o prompt para o Gemini baseado nos dados do usuário
+        Plano de vários dias: os dias são gerados em paralelo (latência
+        próxima à de um dia) e reunidos com seções por dia e totais da semana
         """
+        days = {day: plan for day, plan in self.iter_plan_days(user_data)}
+        return merge_days([days[day] for day in sorted(days)])
+    
+    def iter_plan_days(self, user_data: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Emite (dia, plano do dia) conforme cada dia fica pronto. Só os dias
+        que falharem são pedidos de novo (PLAN_DAY_RETRIES); os que ainda
+        faltarem saem do otimizador local, evitando alimentos dos outros dias
+        """
+        total_days = user_data.get('days') or 1
+        done = {}
+        
+        if self.use_gemini:
+            app = current_app._get_current_object() if has_app_context() else None
+            pending = list(range(1, total_days + 1))
+            attempts = 1 + int(os.getenv('PLAN_DAY_RETRIES', 1))
+            workers = min(total_days, int(os.getenv('PLAN_DAY_CONCURRENCY', 7)))
+            
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plan-day') as executor:
+                for _ in range(attempts):
+                    futures = {
+                        executor.submit(self._generate_day, app, user_data, day, total_days): day
+                        for day in pending
+                    }
+                    for future in as_completed(futures):
+                        day = futures[future]
+                        try:
+                            done[day] = future.result()
+                        except Exception as e:
+                            print(f"Erro ao gerar o dia {day} com Gemini: {e}")
+                            continue
+                        yield day, done[day]
+                    pending = [day for day in pending if day not in done]
+                    if not pending:
+                        break
+        
+        missing = [day for day in range(1, total_days + 1) if day not in done]
+        if missing:
+            for day, plan in self._generate_local_days(user_data, missing, done.values()):
+                yield day, plan
+    
+    def _generate_day(self, app, user_data: Dict[str, Any], day: int, total_days: int) -> Dict[str, Any]:
+        """Um dia do plano pelo Gemini; levanta erro se a chamada ou o JSON falhar"""
+        if app is not None:
+            with app.app_context():
+                return self._generate_day(None, user_data, day, total_days)
+        
+        cache_key = f"{make_cache_key(user_data)}:day{day}/{total_days}"
+        plan = self.cache.get(cache_key)
+        if plan is not None:
+            return plan
+        
+        if not self._acquire_quota(user_data):
+            raise UpstreamUnavailable('Cota do Gemini esgotada')
+        prompt = self._create_diet_prompt(user_data, day, total_days)
+        try:
+            response = self.resilience.call(lambda timeout: self._call_model(prompt, timeout))
+        except Exception as e:
+            self.quota.observe(e)
+            raise
+        self.quota.observe()
+        
+        plan = self._with_local_nutrition(self._decode_ai_response(response.text, user_data, day, total_days))
+        self.cache.set(cache_key, plan)
+        return plan
+    
+    def _generate_local_days(self, user_data: Dict[str, Any], days, other_plans) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Dias pelo otimizador local, cada um evitando os alimentos já usados"""
+        try:
+            from src.services.meal_optimizer import get_meal_optimizer
+            
+            optimizer = get_meal_optimizer()
+            used = set()
+            for plan in other_plans:
+                used |= used_foods(optimizer.engine, plan)
+            while days:
+                plan = optimizer.generate(user_data, avoid=used)
+                used |= used_foods(optimizer.engine, plan)
+                yield days.pop(0), plan
+        except Exception as e:
+            print(f"Erro no otimizador local de planos: {e}")
+            for day in days:
+                yield day, self._generate_static_plan(user_data)
+    
+    def stream_diet_plan(self, user_data: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        """
+        Gera o plano em streaming: emite ('meal', (nome, refeição)) assim que cada
+        refeição fica completa e, no fim, ('plan', plano completo). Planos de
+        vários dias emitem ('day', (dia, plano do dia)) no lugar das refeições
+        """
+        if (user_data.get('days') or 1) > 1:
+            days = {}
+            for day, plan in self.iter_plan_days(user_data):
+                days[day] = plan
+                yield 'day', (day, plan)
+            yield 'plan', merge_days([days[day] for day in sorted(days)])
+            return
+        
+        cache_key = make_cache_key(user_data)
+        use_gemini = self.use_gemini
+        plan = self.cache.get(cache_key) if use_gemini else None
+        if plan is None and use_gemini:
+            plan = self._find_approved_plan(user_data)
+        
+        if plan is None and use_gemini and self._acquire_quota(user_data):
+            emitted = set()
+            started = finished = error = None
+            try:
+                started = self.resilience.guard()
+                deadline = started + self.resilience.timeout
+                prompt = self._create_diet_prompt(user_data)
+                parser = IncrementalObjectParser(MEAL_KEYS)
+                chunks = []
+                
+                stream = self._call_model(prompt, self.resilience.timeout, stream=True)
+                for chunk in stream:
+                    if time.monotonic() > deadline:
+                        raise DeadlineExceeded(f'Gemini não concluiu em {self.resilience.timeout:.1f}s')
+                    text = chunk.text
+                    chunks.append(text)
+                    for meal, data in parser.feed(text):
+                        if meal not in emitted:
+                            emitted.add(meal)
+                            yield 'meal', (meal, data)
+                self.resilience.record(started, ok=True)
+                self.quota.observe()
+                finished = True
+                
+                plan = self._with_local_nutrition(self._decode_ai_response(''.join(chunks), user_data))
+                self.cache.set(cache_key, plan)
+                
+            except UpstreamUnavailable:
+                plan = None
+            except Exception as e:
+                error = e
+                print(f"Erro ao gerar plano com Gemini (streaming): {e}")
+                plan = None
+            finally:
+                # Também quando o cliente SSE desconecta (GeneratorExit no yield):
+                # sem o registro, uma chamada de teste deixaria o disjuntor preso em half_open
+                if started is not None and not finished:
+                    self.resilience.record(started, ok=False, timed_out=isinstance(error, TimeoutError))
+                    if error is not None:
+                        self.quota.observe(error)
+            
+            if plan is None:
+                # O plano simulado substitui integralmente o que já foi emitido
+                plan = self._generate_mock_plan(user_data)
+            else:
+                for meal in MEAL_KEYS:
+                    if meal not in emitted:
+                        yield 'meal', (meal, plan[meal])
+            
+            yield 'plan', plan
+            return
+        
+        if plan is None:
+            plan = self._generate_mock_plan(user_data)
+        for meal in MEAL_KEYS:
+            yield 'meal', (meal, plan[meal])
+        yield 'plan', plan
+    
+    def _find_approved_plan(self, user_data: Dict[str, Any]):
+        """Plano aprovado pelo nutricionista para o perfil mais próximo (PLAN_REUSE_MAX_DISTANCE)"""
+        from src.services.plan_index import approved_plan_index
+        
+        try:
+            match = approved_plan_index.lookup(user_data)
+            if match is None:
+                return None
+            plan_id, distance = match
+            
+            from src.models.nutriai_models import DietPlan
+            
+            approved = DietPlan.query.get(plan_id)
+            plan = approved.get_ai_plan() if approved is not None and approved.status == 'approved' else None
+            if not plan or 'days' in plan:
+                # Apagado, revalidado ou de vários dias: não serve para este pedido
+                approved_plan_index.remove(plan_id)
+                return None
+            
+            print(f"♻️ Reaproveitando o plano aprovado {plan_id} (distância {distance:.2f})")
+            plan['reused_plan_id'] = plan_id
+            return plan
+        except Exception as e:
+            print(f"Erro ao buscar plano aprovado semelhante: {e}")
+            return None
+    
+    def _acquire_quota(self, user_data: Dict[str, Any]) -> bool:
+        """
+        Reserva uma chamada na cota compartilhada, com prioridade pelo plano
+        da assinatura; False = cota esgotada (o plano é gerado localmente)
+        """
+        if not self.quota.enabled:
+            # Sem agendador (GEMINI_QUOTA_RPM=0) nem a assinatura é consultada
+            return True
+        try:
+            tier = self.quota.tier_for(user_data.get('user_id'))
+            if self.quota.acquire(tier):
+                return True
+        except Exception as e:
+            print(f"⚠️ Cota do Gemini indisponível, seguindo sem controle: {e}")
+            return True
+        
+        print(f"⏳ Cota do Gemini esgotada (plano {tier}): usando o plano local")
+        return False
+    
+    def _create_diet_prompt(self, user_data: Dict[str, Any], day: int = 1, total_days: int = 1) -> str:
+        """
+        Cria o prompt para o Gemini baseado nos dados do usuário (em planos de
+        vários dias, um prompt por dia, com tema próprio para variar o cardápio)
+        """
+        if total_days > 1:
+            scope = (
+                f"Crie o plano do dia {day} de um cardápio de {total_days} dias, com 4 refeições: "
+                f"café da manhã, almoço, jantar e lanche. Tema do dia: {day_theme(day)}; "
+                f"varie pratos e ingredientes em relação a um cardápio comum"
+            )
+        else:
+            scope = "Crie um plano para 1 dia com 4 refeições: café da manhã, almoço, jantar e lanche"
+        
         prompt = f"""
         Você é um nutricionista especialista. Crie um plano alimentar personalizado com as seguintes especificações:
 
@@ -49,7 +360,7 @@ class GeminiService:
         - Restrições alimentares: {user_data.get('dietary_restrictions', 'Nenhuma')}
 
         INSTRUÇÕES:
-        1. Crie um plano para 1 dia com 4 refeições: café da manhã, almoço, jantar e lanche
+        1. {scope}
         2. Respeite rigorosamente o orçamento por refeição
         3. Considere as restrições alimentares
         4. Inclua preços estimados dos alimentos (valores brasileiros realistas)
@@ -100,27 +411,114 @@ class GeminiService:
         """
         return prompt
     
+    def _decode_ai_response(self, response_text: str, user_data: Dict[str, Any] = None,
+                            day: int = 1, total_days: int = 1) -> Dict[str, Any]:
+        """
+        Converte a resposta da IA em dicionário, corrigindo defeitos comuns do
+        JSON. Com user_data, só as refeições perdidas são pedidas de novo;
+        sem ele, levanta erro se faltar alguma
+        """
+        try:
+            plan, missing, outcome = decode_plan(response_text)
+        except ValueError:
+            self.parse_stats.record('failed')
+            raise
+        self.parse_stats.record(outcome)
+        
+        if missing:
+            if user_data is None:
+                raise ValueError(f"Refeições não encontradas: {', '.join(missing)}")
+            plan = self._complete_plan(plan, missing, user_data, day, total_days)
+        return plan
+    
+    def _complete_plan(self, plan: Dict[str, Any], missing, user_data: Dict[str, Any],
+                       day: int = 1, total_days: int = 1) -> Dict[str, Any]:
+        """
+        Completa um plano aproveitado em parte: pede ao Gemini só as refeições
+        que faltam e, se ainda faltar alguma, usa a do otimizador local
+        """
+        print(f"🩹 Resposta da IA incompleta: pedindo de novo só {', '.join(missing)}")
+        if self._acquire_quota(user_data):
+            prompt = self._create_meals_prompt(user_data, plan, missing, day, total_days)
+            try:
+                response = self.resilience.call(lambda timeout: self._call_model(prompt, timeout, meals=missing))
+                self.quota.observe()
+                meals, _, outcome = decode_plan(response.text, missing)
+                self.parse_stats.record(outcome)
+                found = [meal for meal in missing if meal in meals]
+                plan.update({meal: meals[meal] for meal in found})
+                self.parse_stats.record('meals_regenerated', len(found))
+            except ValueError as e:
+                self.parse_stats.record('failed')
+                print(f"Erro ao completar plano com Gemini: {e}")
+            except Exception as e:
+                if not isinstance(e, UpstreamUnavailable):
+                    self.quota.observe(e)
+                print(f"Erro ao completar plano com Gemini: {e}")
+        
+        local = [meal for meal in missing if meal not in plan]
+        if local:
+            fallback = self._generate_mock_plan(user_data)
+            plan.update({meal: fallback[meal] for meal in local})
+            plan['local_meals'] = local
+            self.parse_stats.record('meals_filled_locally', len(local))
+        return recompute_totals(plan)
+    
+    def _create_meals_prompt(self, user_data: Dict[str, Any], plan: Dict[str, Any], missing,
+                             day: int = 1, total_days: int = 1) -> str:
+        """Prompt para completar um plano: só as refeições que faltam, sem repetir as já definidas"""
+        defined = '\n'.join(
+            f"        - {MEAL_NAMES[meal]}: {plan[meal]['description']}" for meal in MEAL_KEYS if meal in plan
+        )
+        theme = f" Tema do dia: {day_theme(day)}." if total_days > 1 else ""
+        meal_format = ',\n'.join(
+            f'            "{meal}": {{"description": "...", "foods": ["alimento 1"], "preparation": "...", '
+            f'"estimated_cost": 0.00, "calories": 0, "macros": {{"protein": 0, "carbs": 0, "fat": 0}}}}'
+            for meal in missing
+        )
+        return f"""
+        Você é um nutricionista especialista. Complete um plano alimentar de 1 dia que já tem estas refeições:
+{defined}
+
+        DADOS DO USUÁRIO:
+        - Idade: {user_data.get('age', 'Não informado')} anos
+        - Peso: {user_data.get('weight', 'Não informado')} kg
+        - Altura: {user_data.get('height', 'Não informado')} cm
+        - Objetivo: {user_data.get('goal', 'Melhorar saúde')}
+        - Orçamento por refeição: R$ {user_data.get('budget_per_meal', 25.00)}
+        - Restrições alimentares: {user_data.get('dietary_restrictions', 'Nenhuma')}
+
+        Crie apenas: {', '.join(MEAL_NAMES[meal] for meal in missing)}, sem repetir os pratos acima.{theme}
+
+        FORMATO DE RESPOSTA (JSON):
+        {{
+{meal_format}
+        }}
+
+        Responda APENAS com o JSON, sem texto adicional.
+        """
+    
+    def _with_local_nutrition(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Recalcula custo, calorias e macros com a tabela de composição e os
+        preços de FoodPrice, no lugar dos valores escritos pela IA
+        """
+        from src.services.nutrition import get_nutrition_engine, nutrition_enabled
+        
+        if not nutrition_enabled():
+            return plan
+        try:
+            return get_nutrition_engine().apply_many([plan])[0]
+        except Exception as e:
+            print(f"Erro ao calcular valores nutricionais: {e}")
+            return plan
+    
     def _parse_ai_response(self, response_text: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Processa a resposta da IA e garante que está no formato correto
         """
         try:
-            # Remove possíveis marcadores de código
-            clean_response = response_text.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            
-            plan = json.loads(clean_response.strip())
-            
-            # Valida se tem os campos obrigatórios
-            required_meals = ['breakfast', 'lunch', 'dinner', 'snack']
-            for meal in required_meals:
-                if meal not in plan:
-                    raise ValueError(f"Refeição {meal} não encontrada")
-            
-            return plan
+            return self._decode_ai_response(response_text, user_data)
             
         except Exception as e:
             print(f"Erro ao processar resposta da IA: {e}")
@@ -128,7 +526,20 @@ class GeminiService:
     
     def _generate_mock_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Gera um plano simulado quando a IA não está disponível
+        Gera o plano sem IA: otimizador local com FoodPrice e a tabela de
+        composição; os planos fixos ficam como última alternativa
+        """
+        try:
+            from src.services.meal_optimizer import get_meal_optimizer
+            
+            return get_meal_optimizer().generate(user_data)
+        except Exception as e:
+            print(f"Erro no otimizador local de planos: {e}")
+            return self._generate_static_plan(user_data)
+    
+    def _generate_static_plan(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gera um plano simulado fixo, baseado apenas no objetivo
         """
         budget = user_data.get('budget_per_meal', 25.00)
         goal = user_data.get('goal', 'Melhorar saúde')
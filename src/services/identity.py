@@ -0,0 +1,102 @@
+import os
+import threading
+from datetime import timedelta
+from typing import Dict, Any, Optional
+
+from cachetools import TTLCache
+from flask import g
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity
+
+# Atributos estáveis de autorização embutidos no token
+IDENTITY_CLAIMS = ('user_type',)
+
+
+class Identity:
+    """Identidade do usuário autenticado, resolvida sem consultar o banco"""
+
+    def __init__(self, user_id: int, user_type: Optional[str]):
+        self.id = user_id
+        self.user_type = user_type
+
+    @property
+    def is_user(self) -> bool:
+        return self.user_type == 'user'
+
+    @property
+    def is_nutritionist(self) -> bool:
+        return self.user_type == 'nutritionist'
+
+
+class IdentityCache:
+    """Cache entre requisições para tokens antigos, sem as claims de autorização"""
+
+    def __init__(self, maxsize: int = None, ttl: int = None):
+        self.maxsize = maxsize or int(os.getenv('IDENTITY_CACHE_SIZE', 4096))
+        self.ttl = ttl or int(os.getenv('IDENTITY_CACHE_TTL', 60))
+        self._cache = TTLCache(maxsize=self.maxsize, ttl=self.ttl)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._cache.get(user_id)
+
+    def set(self, user_id: int, claims: Dict[str, Any]):
+        with self._lock:
+            self._cache[user_id] = claims
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+
+identity_cache = IdentityCache()
+
+
+def user_claims(user) -> Dict[str, Any]:
+    """Claims de autorização de um usuário"""
+    return {claim: getattr(user, claim) for claim in IDENTITY_CLAIMS}
+
+
+def create_user_token(user) -> str:
+    """Cria o token de acesso com as claims de autorização do usuário"""
+    return create_access_token(
+        identity=str(user.id),
+        additional_claims=user_claims(user),
+        expires_delta=timedelta(days=7)
+    )
+
+
+def current_identity() -> Identity:
+    """
+    Retorna a identidade da requisição atual (memorizada em flask.g).
+    Usa as claims do token; para tokens sem claims recorre ao cache e,
+    em último caso, ao banco.
+    """
+    identity = g.get('identity')
+    if identity is not None:
+        return identity
+
+    user_id = int(get_jwt_identity())
+    jwt_claims = get_jwt()
+
+    if all(claim in jwt_claims for claim in IDENTITY_CLAIMS):
+        claims = {claim: jwt_claims[claim] for claim in IDENTITY_CLAIMS}
+    else:
+        claims = identity_cache.get(user_id)
+        if claims is None:
+            from src.models.nutriai_models import User
+
+            user = User.query.get(user_id)
+            claims = user_claims(user) if user else {claim: None for claim in IDENTITY_CLAIMS}
+            identity_cache.set(user_id, claims)
+
+    identity = Identity(user_id, claims['user_type'])
+    g.identity = identity
+    return identity
+
+
+def invalidate_identity(user_id: int):
+    """Descarta a identidade em cache após mudanças no perfil"""
+    identity_cache.invalidate(user_id)
+    if g.get('identity') is not None and g.identity.id == user_id:
+        g.pop('identity')
@@ -0,0 +1,68 @@
+import json
+from typing import Any, List, Tuple, Iterable
+
+
+class IncrementalObjectParser:
+    """
+    Parser incremental do JSON do plano: recebe pedaços de texto e devolve
+    cada valor-objeto de primeiro nível assim que ele é fechado
+    """
+
+    def __init__(self, keys: Iterable[str] = None):
+        self.keys = set(keys) if keys else None
+        self.buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._value_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Adiciona texto e retorna os pares (chave, objeto) completados"""
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._last_string = buffer[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ':' and self._depth == 1:
+                self._current_key = self._last_string
+            elif char in '{[':
+                if char == '{' and self._depth == 1 and self._current_key is not None:
+                    self._value_start = i
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    key = self._current_key
+                    raw = buffer[self._value_start:i + 1]
+                    self._value_start = None
+                    self._current_key = None
+                    if self.keys is None or key in self.keys:
+                        try:
+                            completed.append((key, json.loads(raw)))
+                        except ValueError:
+                            pass
+            elif char == ',' and self._depth == 1:
+                self._current_key = None
+
+        self._pos = len(buffer)
+        return completed
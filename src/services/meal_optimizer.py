@@ -0,0 +1,265 @@
+"""
+Gerador local de planos (sem IA).
+
+Cada refeição é um problema inteiro pequeno: para cada posição do prato
+(proteína, carboidrato, legume, ...) escolhe-se um alimento e uma porção.
+Todas as combinações são avaliadas de uma vez com NumPy e a de menor
+desvio das metas de calorias e macros dentro do orçamento por refeição
+é escolhida — a solução é exata, sem depender de um solver externo.
+"""
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from src.services.nutrition import UNIT_KINDS, NutritionEngine, get_nutrition_engine, normalize_name
+
+# (refeição, fração das calorias do dia, posições: (categorias, opcional))
+MEAL_TEMPLATES = (
+    ('breakfast', 0.25, ((('bread', 'cereal'), False), (('egg', 'dairy', 'supplement'), False), (('fruit',), False))),
+    ('lunch', 0.35, ((('protein',), False), (('grain',), False), (('legume',), True), (('vegetable',), False))),
+    ('dinner', 0.25, ((('protein',), False), (('grain',), False), (('vegetable',), False))),
+    ('snack', 0.15, ((('fruit',), False), (('dairy', 'nut', 'seed', 'supplement'), True))),
+)
+
+# Porções candidatas por categoria (gramas, ml ou unidades)
+GRAM_PORTIONS = {
+    'protein': (80, 100, 120, 150, 180),
+    'grain': (60, 100, 150, 200),
+    'legume': (60, 80, 120),
+    'vegetable': (50, 100, 150),
+    'bread': (40, 60, 80),
+    'cereal': (20, 30, 40, 60),
+    'fruit': (80, 120, 160),
+    'dairy': (30, 50, 100, 170),
+    'supplement': (20, 30),
+    'nut': (10, 15, 20, 30),
+    'seed': (10, 15),
+}
+UNIT_PORTIONS = {'egg': (1, 2, 3), 'bread': (1, 2), 'fruit': (1, 2)}
+LIQUID_PORTIONS = (150, 200, 300)
+LIQUID_CATEGORIES = ('dairy', 'beverage')
+
+# Pesos do desvio relativo (calorias, proteína, carboidratos, gordura)
+TARGET_WEIGHTS = np.array([1.0, 1.0, 0.4, 0.4])
+COST_WEIGHT = 0.05
+OVERSPEND_PENALTY = 50.0
+REPEAT_PENALTY = 0.25
+
+# Restrições em texto livre -> tags excluídas
+RESTRICTION_TAGS = (
+    (('vegano', 'vegana', 'vegan'), {'meat', 'fish', 'egg', 'dairy', 'honey'}),
+    (('vegetariano', 'vegetariana'), {'meat', 'fish'}),
+    (('lactose', 'laticinios', 'lacteos'), {'dairy'}),
+    (('gluten', 'celiaco', 'celiaca', 'celiacos'), {'gluten'}),
+    (('peixe', 'peixes', 'frutos do mar'), {'fish'}),
+    (('amendoim',), {'peanut'}),
+    (('castanha', 'castanhas', 'nozes', 'oleaginosas'), {'nuts'}),
+    (('ovo', 'ovos'), {'egg'}),
+    (('carne vermelha',), {'meat'}),
+)
+
+PREPARATION = {
+    'protein': 'grelhar ou assar {food}',
+    'grain': 'cozinhar {food}',
+    'legume': 'cozinhar {food} com temperos naturais',
+    'vegetable': 'preparar {food} no vapor ou em salada',
+    'egg': 'preparar {food} mexidos ou cozidos',
+    'cereal': 'misturar {food}',
+    'fruit': 'servir {food} ao natural',
+}
+
+
+def _match(text: str, keyword: str) -> bool:
+    return f' {keyword} ' in f' {text} '
+
+
+def excluded_foods(engine: NutritionEngine, restrictions: Optional[str]) -> Set[int]:
+    """Índices dos alimentos proibidos pelas restrições alimentares"""
+    text = normalize_name(restrictions or '')
+    if not text or text in ('nenhuma', 'nenhum', 'nao'):
+        return set()
+
+    tags = set()
+    for keywords, excluded_tags in RESTRICTION_TAGS:
+        if any(_match(text, keyword) for keyword in keywords):
+            tags |= excluded_tags
+
+    excluded = {index for index, food_tags in enumerate(engine.tags) if food_tags & tags}
+    # Alimentos citados pelo nome ("não como brócolis", "alergia a morango")
+    for alias, index in engine.aliases.items():
+        if _match(text, alias):
+            excluded.add(index)
+    return excluded
+
+
+def daily_targets(user_data: Dict[str, Any]) -> Dict[str, float]:
+    """Metas diárias de calorias e macros a partir do perfil e do objetivo"""
+    def number(value, default):
+        try:
+            return float(value) if value else default
+        except (TypeError, ValueError):
+            return default
+
+    weight = number(user_data.get('weight'), 70.0)
+    height = number(user_data.get('height'), 170.0)
+    age = number(user_data.get('age'), 30.0)
+    goal = normalize_name(user_data.get('goal') or '')
+
+    # Mifflin-St Jeor (média entre os sexos) com atividade leve
+    maintenance = (10 * weight + 6.25 * height - 5 * age - 78) * 1.45
+    if any(word in goal for word in ('perder', 'emagrec', 'defini')):
+        calories, protein_per_kg = maintenance * 0.8, 1.8
+    elif any(word in goal for word in ('ganhar', 'massa', 'hipertrofia')):
+        calories, protein_per_kg = maintenance * 1.12, 2.0
+    else:
+        calories, protein_per_kg = maintenance, 1.4
+
+    calories = float(np.clip(calories, 1200, 3500))
+    protein = protein_per_kg * weight
+    fat = 0.27 * calories / 9
+    carbs = max(calories - 4 * protein - 9 * fat, 0.0) / 4
+    return {'calories': calories, 'protein': protein, 'carbs': carbs, 'fat': fat}
+
+
+class MealOptimizer:
+    def __init__(self, engine: NutritionEngine = None):
+        self.engine = engine or get_nutrition_engine()
+
+    def _slot_foods(self, categories: Iterable[str], excluded: Set[int]) -> List[int]:
+        return [
+            index for index, category in enumerate(self.engine.categories)
+            if index not in excluded
+            and (category in categories or ('egg' in categories and 'egg' in self.engine.tags[index]))
+        ]
+
+    def _portions(self, index: int):
+        """Porções candidatas do alimento: [(quantidade, unidade do texto, tipo de unidade)]"""
+        engine = self.engine
+        category = engine.categories[index]
+        unit_g = engine.unit_grams[index, UNIT_KINDS.index('unit')]
+
+        if 'egg' in engine.tags[index]:
+            return [(qty, 'unidades' if qty > 1 else 'unidade', 'unit') for qty in UNIT_PORTIONS['egg']]
+        if category in UNIT_PORTIONS and not np.isnan(unit_g) and unit_g >= 25:
+            return [(qty, 'unidades' if qty > 1 else 'unidade', 'unit') for qty in UNIT_PORTIONS[category]]
+        if category in LIQUID_CATEGORIES and engine.unit_grams[index, UNIT_KINDS.index('ml')] != 1.0:
+            return [(qty, 'ml', 'ml') for qty in LIQUID_PORTIONS]
+        return [(qty, 'g', 'g') for qty in GRAM_PORTIONS.get(category, (50, 100))]
+
+    def _slot_options(self, foods: List[int], optional: bool, prices: np.ndarray, avoid: Set[int]):
+        """Matriz (opções x [kcal, proteína, carb, gordura, custo, penalidade]) de uma posição"""
+        engine = self.engine
+        options, values = [], []
+        for index in foods:
+            for quantity, label, unit in self._portions(index):
+                grams = engine.grams(index, quantity, unit)
+                nutrients = engine.composition[index] * grams
+                values.append([*nutrients, prices[index] * grams, REPEAT_PENALTY if index in avoid else 0.0])
+                options.append((index, quantity, label))
+        if optional or not options:
+            values.append([0.0] * 6)
+            options.append(None)
+        return options, np.array(values)
+
+    def optimize_meal(self, slots, target: np.ndarray, budget: float, prices: np.ndarray,
+                      excluded: Set[int], avoid: Set[int]):
+        """Escolhe a combinação (alimento, porção) de menor custo-objetivo para a refeição"""
+        slot_options, shape = [], []
+        # Uma coluna por grandeza (kcal, proteína, carb, gordura, custo, penalidade)
+        columns = [np.zeros(1, dtype=np.float32) for _ in range(6)]
+        for categories, optional in slots:
+            options, values = self._slot_options(self._slot_foods(categories, excluded), optional, prices, avoid)
+            slot_options.append(options)
+            shape.append(len(options))
+            # Soma de todas as combinações (produto externo achatado)
+            values = values.astype(np.float32)
+            columns = [np.add.outer(columns[k], values[:, k]).ravel() for k in range(6)]
+
+        cost = columns[4]
+        score = columns[5] + COST_WEIGHT * cost / budget + OVERSPEND_PENALTY * np.maximum(cost / budget - 1.0, 0.0)
+        for k in range(4):
+            deviation = (columns[k] - target[k]) / max(target[k], 1.0)
+            score += TARGET_WEIGHTS[k] * deviation * deviation
+
+        best = int(np.argmin(score))
+        choice = np.unravel_index(best, shape)
+        picked = [slot_options[slot][option] for slot, option in enumerate(choice)]
+        return [item for item in picked if item is not None], bool(cost[best] <= budget + 1e-9)
+
+    def _meal_text(self, items):
+        engine = self.engine
+        labels = [engine.labels[index] for index, _, _ in items]
+        sides = [label.lower() for label in labels[1:]]
+        if len(sides) > 1:
+            description = f"{labels[0]} com {', '.join(sides[:-1])} e {sides[-1]}"
+        elif sides:
+            description = f"{labels[0]} com {sides[0]}"
+        else:
+            description = labels[0] if labels else ''
+
+        steps = []
+        for index, _, _ in items:
+            key = 'egg' if 'egg' in engine.tags[index] else engine.categories[index]
+            template = PREPARATION.get(key, 'servir {food}')
+            steps.append(template.format(food=engine.labels[index].lower()))
+        preparation = '; '.join(steps)
+        return description, preparation[:1].upper() + preparation[1:]
+
+    def generate(self, user_data: Dict[str, Any], avoid: Set[int] = None, location: str = None) -> Dict[str, Any]:
+        """Monta o plano de 4 refeições no mesmo formato das respostas do Gemini"""
+        budget = float(user_data.get('budget_per_meal') or 25.0)
+        targets = daily_targets(user_data)
+        daily = np.array([targets['calories'], targets['protein'], targets['carbs'], targets['fat']])
+        excluded = excluded_foods(self.engine, user_data.get('dietary_restrictions'))
+        prices = self.engine.price_per_gram(location)
+
+        # Evita repetir o mesmo alimento no dia (começa pelas refeições maiores)
+        used = set(avoid or ())
+        plan, within_budget = {}, True
+        for meal, share, slots in sorted(MEAL_TEMPLATES, key=lambda template: -template[1]):
+            items, fits = self.optimize_meal(slots, daily * share, budget, prices, excluded, used)
+            within_budget &= fits
+            used |= {index for index, _, _ in items}
+
+            description, preparation = self._meal_text(items)
+            plan[meal] = {
+                'description': description,
+                'foods': [f"{self.engine.labels[index]} ({_format_quantity(quantity)}{'' if unit in ('g', 'ml') else ' '}{unit})"
+                          for index, quantity, unit in items],
+                'preparation': preparation,
+                'estimated_cost': 0.0,
+                'calories': 0,
+                'macros': {'protein': 0, 'carbs': 0, 'fat': 0}
+            }
+
+        plan = {meal: plan[meal] for meal, _, _ in MEAL_TEMPLATES}
+        self.engine.apply_many([plan], location)
+
+        budget_note = 'dentro do' if within_budget else 'o mais próximo possível do'
+        plan['nutritionist_notes'] = (
+            f"Plano gerado localmente (sem IA) para cerca de {targets['calories']:.0f} kcal e "
+            f"{targets['protein']:.0f} g de proteína por dia, {budget_note} orçamento de "
+            f"R$ {budget:.2f} por refeição. Recomenda-se revisão do nutricionista."
+        )
+        plan['generator'] = 'local'
+        return plan
+
+
+def _format_quantity(quantity) -> str:
+    return str(int(quantity)) if float(quantity).is_integer() else f"{quantity:g}"
+
+
+def local_generator_enabled() -> bool:
+    """PLAN_GENERATOR=local gera todos os planos sem chamar o Gemini"""
+    return os.getenv('PLAN_GENERATOR', 'gemini').lower() == 'local'
+
+
+_optimizer: Optional[MealOptimizer] = None
+
+
+def get_meal_optimizer() -> MealOptimizer:
+    global _optimizer
+    if _optimizer is None:
+        _optimizer = MealOptimizer()
+    return _optimizer
@@ -0,0 +1,437 @@
+"""
+Cálculo local de custo, calorias e macros dos planos.
+
+Cada item de "foods" (ex.: "Peito de frango (150g)", "Ovos (2 unidades)")
+é interpretado, associado à tabela de composição em src/data e aos preços
+de FoodPrice, e os valores de todos os itens de todos os planos são
+calculados de uma vez com NumPy.
+"""
+import csv
+import os
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+COMPOSITION_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'food_composition.csv')
+
+# Colunas da matriz de composição (valores por 100 g)
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+# Unidades reconhecidas nos itens do plano
+UNIT_KINDS = ('g', 'kg', 'mg', 'ml', 'l', 'unit', 'slice', 'spoon', 'teaspoon', 'cup', 'glass')
+UNIT_ALIASES = {
+    'g': 'g', 'gr': 'g', 'grama': 'g', 'gramas': 'g',
+    'kg': 'kg', 'quilo': 'kg', 'quilos': 'kg',
+    'mg': 'mg',
+    'ml': 'ml',
+    'l': 'l', 'litro': 'l', 'litros': 'l',
+    'un': 'unit', 'und': 'unit', 'unid': 'unit', 'unidade': 'unit', 'unidades': 'unit',
+    'fatia': 'slice', 'fatias': 'slice',
+    'colher': 'spoon', 'colheres': 'spoon', 'colher de sopa': 'spoon', 'colheres de sopa': 'spoon',
+    'colher de cha': 'teaspoon', 'colheres de cha': 'teaspoon',
+    'xicara': 'cup', 'xicaras': 'cup',
+    'copo': 'glass', 'copos': 'glass',
+}
+DEFAULT_SLICE_G = 30.0
+DEFAULT_SPOON_G = 15.0
+CUP_ML = 240.0
+GLASS_ML = 200.0
+
+# Preparos e adjetivos ignorados na busca do alimento
+IGNORED_WORDS = {
+    'cozido', 'cozida', 'cozidos', 'cozidas', 'grelhado', 'grelhada', 'assado', 'assada',
+    'refogado', 'refogada', 'cru', 'crua', 'fresco', 'fresca', 'picado', 'picada', 'natural',
+    'light', 'organico', 'organica', 'fatiado', 'fatiada', 'em', 'cubos'
+}
+
+_UNIT_PATTERN = '|'.join(sorted((re.escape(alias) for alias in UNIT_ALIASES), key=len, reverse=True))
+_QTY_PATTERN = r'\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?'
+# "Peito de frango (150g)", "Ovos (2 unidades)"
+_PAREN_RE = re.compile(rf'^(?P<name>.+?)\s*\(\s*(?P<qty>{_QTY_PATTERN})?\s*(?P<unit>{_UNIT_PATTERN})?\s*\)')
+# "150g de peito de frango", "2 ovos"
+_LEADING_RE = re.compile(rf'^(?P<qty>{_QTY_PATTERN})\s*(?P<unit>{_UNIT_PATTERN})?\s+(?:de\s+)?(?P<name>.+)$')
+
+
+def normalize_name(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9 ]+', ' ', text).split())
+
+
+def _parse_quantity(raw: Optional[str]) -> float:
+    if not raw:
+        return 1.0
+    raw = raw.replace(',', '.').replace(' ', '')
+    if '/' in raw:
+        numerator, denominator = raw.split('/', 1)
+        return float(numerator) / float(denominator) if float(denominator) else 1.0
+    return float(raw)
+
+
+@lru_cache(maxsize=8192)
+def parse_food(text: str) -> Optional[Tuple[str, float, str]]:
+    """
+    Interpreta um item do plano e retorna (nome normalizado, quantidade,
+    tipo de unidade) ou None se não houver quantidade reconhecível
+    """
+    folded = unicodedata.normalize('NFKD', text or '')
+    folded = ''.join(char for char in folded if not unicodedata.combining(char)).lower().strip()
+
+    match = _PAREN_RE.match(folded) or _LEADING_RE.match(folded)
+    if not match or not (match.group('qty') or match.group('unit')):
+        return None
+
+    unit = UNIT_ALIASES[match.group('unit')] if match.group('unit') else 'unit'
+    return normalize_name(match.group('name')), _parse_quantity(match.group('qty')), unit
+
+
+def _float(value: str) -> float:
+    return float(value) if value not in (None, '') else np.nan
+
+
+class NutritionEngine:
+    """Tabela de composição + preços, com cálculo vetorizado por item"""
+
+    def __init__(self, composition_path: str = None, price_ttl: int = None):
+        self.composition_path = composition_path or COMPOSITION_PATH
+        self.price_ttl = price_ttl if price_ttl is not None else int(os.getenv('NUTRITION_PRICE_TTL', 300))
+
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        self.categories: List[str] = []
+        self.tags: List[set] = []
+        self.aliases: Dict[str, int] = {}
+        rows = []
+        with open(self.composition_path, encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                index = len(self.names)
+                self.names.append(row['name'])
+                self.labels.append(row['label'] or row['name'].capitalize())
+                self.categories.append(row['category'])
+                self.tags.append({tag for tag in row['tags'].split('|') if tag})
+                for alias in [row['name'], row['label']] + [a for a in row['aliases'].split('|') if a]:
+                    self.aliases.setdefault(normalize_name(alias), index)
+                rows.append(row)
+
+        # Nutrientes por grama (n_alimentos x len(NUTRIENTS))
+        self.composition = np.array(
+            [[_float(row['kcal']), _float(row['protein']), _float(row['carbs']), _float(row['fat'])] for row in rows]
+        ) / 100.0
+
+        # Gramas por unidade de cada tipo (NaN = conversão desconhecida)
+        unit_g = np.array([_float(row['unit_g']) for row in rows])
+        spoon_g = np.array([_float(row['spoon_g']) for row in rows])
+        density = np.array([_float(row['density']) for row in rows])
+        density = np.where(np.isnan(density), 1.0, density)
+        spoon_g = np.where(np.isnan(spoon_g), DEFAULT_SPOON_G, spoon_g)
+        columns = {
+            'g': np.ones(len(rows)),
+            'kg': np.full(len(rows), 1000.0),
+            'mg': np.full(len(rows), 0.001),
+            'ml': density,
+            'l': density * 1000.0,
+            'unit': unit_g,
+            'slice': np.where(np.isnan(unit_g), DEFAULT_SLICE_G, unit_g),
+            'spoon': spoon_g,
+            'teaspoon': spoon_g / 3.0,
+            'cup': density * CUP_ML,
+            'glass': density * GLASS_ML,
+        }
+        self.unit_grams = np.column_stack([columns[kind] for kind in UNIT_KINDS])
+
+        # Preço de referência (R$/kg) usado quando FoodPrice não tem o alimento
+        self.reference_price = np.array([_float(row['price_kg']) for row in rows]) / 1000.0
+        self._prices = {}
+        self._prices_loaded_at = {}
+        self._lock = threading.Lock()
+
+        self._alias_keys = sorted(self.aliases, key=len, reverse=True)
+        self._resolve = lru_cache(maxsize=8192)(self._resolve_uncached)
+        self._price_names: Dict[str, int] = {}
+
+
+    def _resolve_uncached(self, name: str) -> int:
+        if name in self.aliases:
+            return self.aliases[name]
+        words = [word for word in name.split() if word not in IGNORED_WORDS]
+        stripped = ' '.join(words)
+        if stripped in self.aliases:
+            return self.aliases[stripped]
+        # Maior alias contido no nome ("batata doce assada" -> "batata doce")
+        padded = f' {stripped} '
+        for alias in self._alias_keys:
+            if f' {alias} ' in padded:
+                return self.aliases[alias]
+        return -1
+
+    def resolve(self, name: str) -> int:
+        """Índice do alimento na tabela de composição, ou -1"""
+        return self._resolve(normalize_name(name))
+
+    def grams(self, food_index: int, quantity: float, unit: str) -> float:
+        return quantity * self.unit_grams[food_index, UNIT_KINDS.index(unit)]
+
+
+    def price_per_gram(self, location: Optional[str] = None) -> np.ndarray:
+        """Preço por grama de cada alimento: mediana de FoodPrice ou preço de referência"""
+        key = normalize_name(location) if location else ''
+        with self._lock:
+            loaded_at = self._prices_loaded_at.get(key)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.price_ttl:
+                return self._prices[key]
+
+        prices = self._load_prices(location)
+        with self._lock:
+            self._prices[key] = prices
+            self._prices_loaded_at[key] = time.monotonic()
+        return prices
+
+    def _load_prices(self, location: Optional[str]) -> np.ndarray:
+        from src.services.food_index import food_name_index
+
+        prices = self.reference_price.copy()
+        food_name_index.refresh_if_due()
+        rows = food_name_index.row_arrays()
+        if not len(rows['price']):
+            return prices
+
+        # Alimento de cada nome distinto e gramas de cada unidade distinta
+        foods = np.array([self._food_of(name) for name in rows['names']], dtype=np.int64)[rows['name_id']]
+        units = [parse_food(f"x ({unit})") if unit else None for unit in rows['units']]
+        quantity = np.array([parsed[1] if parsed else np.nan for parsed in units])[rows['unit']]
+        kind = np.array([UNIT_KINDS.index(parsed[2]) if parsed else 0 for parsed in units])[rows['unit']]
+
+        valid = (foods >= 0) & ~np.isnan(quantity) & (rows['price'] > 0)
+        grams = quantity[valid] * self.unit_grams[foods[valid], kind[valid]]
+        per_gram = rows['price'][valid] / grams
+        foods, row_locations = foods[valid], rows['location'][valid]
+        usable = np.isfinite(per_gram) & (grams > 0)
+        foods, per_gram, row_locations = foods[usable], per_gram[usable], row_locations[usable]
+
+        # Mediana por alimento; a do local, quando houver, tem prioridade
+        _set_medians(prices, foods, per_gram)
+        wanted = normalize_name(location) if location else None
+        if wanted and wanted in rows['locations']:
+            local = row_locations == rows['locations'].index(wanted)
+            _set_medians(prices, foods[local], per_gram[local])
+        return prices
+
+    def _food_of(self, name: str) -> int:
+        """Alimento de um nome já normalizado de FoodPrice (memoizado sem limite)"""
+        index = self._price_names.get(name)
+        if index is None:
+            index = self._price_names[name] = self._resolve_uncached(name)
+        return index
+
+    def invalidate_prices(self):
+        with self._lock:
+            self._prices_loaded_at.clear()
+
+
+    def analyze(self, plans: List[Dict[str, Any]], location: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Calcula custo e nutrientes de cada refeição de cada plano em uma
+        única passada vetorizada sobre todos os itens
+        """
+        meal_refs = []
+        food_index, unit_index, quantities, meal_of_item, texts = [], [], [], [], []
+
+        for plan_number, plan in enumerate(plans):
+            for meal, data in plan.items():
+                if not isinstance(data, dict) or not isinstance(data.get('foods'), list):
+                    continue
+                slot = len(meal_refs)
+                meal_refs.append((plan_number, meal))
+                for item in data['foods']:
+                    parsed = parse_food(item) if isinstance(item, str) else None
+                    food_index.append(self._resolve(parsed[0]) if parsed else -1)
+                    unit_index.append(UNIT_KINDS.index(parsed[2]) if parsed else 0)
+                    quantities.append(parsed[1] if parsed else 0.0)
+                    meal_of_item.append(slot)
+                    texts.append(item)
+
+        food_index = np.array(food_index, dtype=np.int64)
+        unit_index = np.array(unit_index, dtype=np.int64)
+        quantities = np.array(quantities, dtype=np.float64)
+        meal_of_item = np.array(meal_of_item, dtype=np.int64)
+        n_meals = len(meal_refs)
+
+        known = food_index >= 0
+        safe_index = np.where(known, food_index, 0)
+        grams = quantities * self.unit_grams[safe_index, unit_index]
+        resolved = known & ~np.isnan(grams)
+        grams = np.where(resolved, grams, 0.0)
+
+        nutrients = self.composition[safe_index] * grams[:, None]
+        cost = self.price_per_gram(location)[safe_index] * grams
+
+        def per_meal(weights):
+            return np.bincount(meal_of_item, weights=weights, minlength=n_meals)
+
+        meal_cost = per_meal(cost)
+        meal_nutrients = np.column_stack([per_meal(nutrients[:, column]) for column in range(len(NUTRIENTS))]) \
+            if n_meals else np.zeros((0, len(NUTRIENTS)))
+        meal_items = np.bincount(meal_of_item, minlength=n_meals)
+        meal_resolved = np.bincount(meal_of_item, weights=resolved.astype(np.float64), minlength=n_meals)
+
+        unresolved_by_meal = {}
+        for position in np.flatnonzero(~resolved):
+            unresolved_by_meal.setdefault(int(meal_of_item[position]), []).append(texts[position])
+
+        results = [{'meals': {}} for _ in plans]
+        for slot, (plan_number, meal) in enumerate(meal_refs):
+            calories, protein, carbs, fat = meal_nutrients[slot]
+            results[plan_number]['meals'][meal] = {
+                'estimated_cost': round(float(meal_cost[slot]), 2),
+                'calories': int(round(calories)),
+                'macros': {'protein': round(float(protein), 1), 'carbs': round(float(carbs), 1),
+                           'fat': round(float(fat), 1)},
+                'items': int(meal_items[slot]),
+                'resolved': int(meal_resolved[slot]),
+                'unresolved': unresolved_by_meal.get(slot, [])
+            }
+        return results
+
+    @staticmethod
+    def apply(plan: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Substitui os valores das refeições totalmente reconhecidas pelos
+        calculados e refaz os totais do plano a partir das refeições
+        """
+        computed_meals = []
+        total_items = resolved_items = 0
+        for meal, values in analysis['meals'].items():
+            total_items += values['items']
+            resolved_items += values['resolved']
+            if values['items'] and values['resolved'] == values['items']:
+                plan[meal].update({
+                    'estimated_cost': values['estimated_cost'],
+                    'calories': values['calories'],
+                    'macros': values['macros']
+                })
+                computed_meals.append(meal)
+
+        if not analysis['meals']:
+            return plan
+
+        def number(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return 0.0
+
+        meals = [plan[meal] for meal in analysis['meals']]
+        plan['total_cost'] = round(sum(number(meal.get('estimated_cost')) for meal in meals), 2)
+        plan['total_calories'] = int(round(sum(number(meal.get('calories')) for meal in meals)))
+        plan['total_macros'] = {
+            macro: round(sum(number((meal.get('macros') or {}).get(macro)) for meal in meals), 1)
+            for macro in ('protein', 'carbs', 'fat')
+        }
+        plan['nutrition_engine'] = {
+            'computed_meals': computed_meals,
+            'resolved_items': resolved_items,
+            'total_items': total_items
+        }
+        return plan
+
+    def apply_many(self, plans: List[Dict[str, Any]], location: Optional[str] = None) -> List[Dict[str, Any]]:
+        for plan, analysis in zip(plans, self.analyze(plans, location)):
+            self.apply(plan, analysis)
+        return plans
+
+
+def nutrition_enabled() -> bool:
+    return os.getenv('NUTRITION_ENGINE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+
+
+def recompute_plan_totals(engine: 'NutritionEngine', batch_size: int = 1000, dry_run: bool = False,
+                          log=print) -> Dict[str, Any]:
+    """
+    Recalcula em lotes o custo e os nutrientes de todos os planos gravados
+    (uma chamada vetorizada por lote) e atualiza as colunas de totais
+    """
+    import copy
+    from src.models.nutriai_models import db, DietPlan
+    from src.services.weekly_plan import plan_days, refresh_totals
+
+    rows = items = resolved = 0
+    compute_seconds = 0.0
+    started = time.perf_counter()
+    last_id = 0
+
+    while True:
+        plans = (DietPlan.query
+                 .filter(DietPlan.id > last_id)
+                 .order_by(DietPlan.id)
+                 .limit(batch_size)
+                 .all())
+        if not plans:
+            break
+
+        plan_dicts = [copy.deepcopy(plan.get_ai_plan()) for plan in plans]
+        start = time.perf_counter()
+        # Planos de vários dias: cada dia é calculado e os totais da semana refeitos
+        day_dicts = [day for plan_dict in plan_dicts for day in plan_days(plan_dict)]
+        analyses = engine.analyze(day_dicts)
+        for day_dict, analysis in zip(day_dicts, analyses):
+            engine.apply(day_dict, analysis)
+            for values in analysis['meals'].values():
+                items += values['items']
+                resolved += values['resolved']
+        for plan_dict in plan_dicts:
+            if isinstance(plan_dict.get('days'), list):
+                refresh_totals(plan_dict)
+        compute_seconds += time.perf_counter() - start
+
+        if not dry_run:
+            for plan, plan_dict in zip(plans, plan_dicts):
+                plan.set_ai_plan(plan_dict)
+            db.session.commit()
+        else:
+            db.session.rollback()
+
+        rows += len(plans)
+        last_id = plans[-1].id
+        log(f"  {rows} planos recalculados")
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'items': items,
+        'resolved_items': resolved,
+        'coverage': round(resolved / items, 3) if items else 0,
+        'compute_plans_per_second': round(rows / compute_seconds) if compute_seconds else 0,
+        'plans_per_second': round(rows / elapsed) if elapsed else 0
+    }
+
+
+def _set_medians(prices: np.ndarray, foods: np.ndarray, values: np.ndarray):
+    """prices[f] = mediana de values onde foods == f"""
+    if not len(foods):
+        return
+    order = np.lexsort((values, foods))
+    foods, values = foods[order], values[order]
+    starts = np.flatnonzero(np.r_[True, foods[1:] != foods[:-1]])
+    ends = np.r_[starts[1:], len(foods)]
+    for start, end in zip(starts, ends):
+        middle = (start + end - 1) / 2
+        prices[foods[start]] = (values[int(np.floor(middle))] + values[int(np.ceil(middle))]) / 2
+
+
+_engine: Optional[NutritionEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_nutrition_engine() -> NutritionEngine:
+    """Motor compartilhado (a tabela de composição é lida no primeiro uso)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = NutritionEngine()
+        return _engine
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Fila de hashing cheia: a requisição deve ser recusada (503)"""
+
+
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash: str, password: str) -> bool:
+    return check_password_hash(password_hash, password)
+
+
+class PasswordHasher:
+    """
+    Hashing de senhas com parâmetros configuráveis. Com PASSWORD_HASH_WORKERS
+    definido, roda em um pool de processos limitado para não ocupar a CPU das
+    threads de requisição; sem ele (ou onde não há multiprocessing, como no
+    Vercel/AWS Lambda), roda na própria thread.
+    """
+
+    def __init__(self, method: str = None, workers: int = None, max_pending: int = None, timeout: float = None):
+        self.method = method or os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+        self.workers = workers if workers is not None else int(os.getenv('PASSWORD_HASH_WORKERS') or 0)
+        self.max_pending = max_pending or int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', self.workers * 8 or 8))
+        self.timeout = timeout or float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._canonical_method = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        # Um pool por processo: workers do gunicorn criam o seu após o fork
+        with self._lock:
+            if self.workers <= 0:
+                return None
+            if self._executor is None or self._executor_pid != os.getpid():
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context())
+                except (OSError, NotImplementedError, ValueError) as e:
+                    print(f"⚠️ Pool de hashing indisponível, usando a própria thread: {e}")
+                    self.workers = 0
+                    self._executor = None
+                    return None
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    @staticmethod
+    def _mp_context():
+        # Sem fork: o processo já tem threads (jobs de planos, hedge do Gemini)
+        methods = multiprocessing.get_all_start_methods()
+        method = os.getenv('PASSWORD_HASH_START_METHOD') or ('forkserver' if 'forkserver' in methods else 'spawn')
+        return multiprocessing.get_context(method)
+
+    def _run(self, fn, *args):
+        executor = self._get_executor()
+        if executor is None:
+            return fn(*args)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy('Muitas requisições de autenticação simultâneas')
+        try:
+            future = executor.submit(fn, *args)
+        except (OSError, RuntimeError) as e:
+            self._slots.release()
+            print(f"⚠️ Falha no pool de hashing, usando a própria thread: {e}")
+            return fn(*args)
+        # A vaga só é liberada quando a tarefa termina de fato, mesmo após o prazo
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise PasswordHasherBusy('Hashing de senha não concluiu no prazo')
+        except BrokenProcessPool as e:
+            # Processo do pool morreu: o pool é recriado na próxima chamada
+            print(f"⚠️ Pool de hashing interrompido, usando a própria thread: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            return fn(*args)
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(_verify, password_hash, password)
+
+    @property
+    def canonical_method(self) -> str:
+        """Método com todos os parâmetros, como aparece no hash armazenado"""
+        if self._canonical_method is None:
+            self._canonical_method = generate_password_hash('', method=self.method).split('$', 1)[0]
+        return self._canonical_method
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Indica se o hash foi gerado com parâmetros diferentes dos configurados"""
+        return password_hash.split('$', 1)[0] != self.canonical_method
+
+
+# Instância global do hasher
+password_hasher = PasswordHasher()
@@ -0,0 +1,152 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from cachetools import TTLCache
+
+# Campos de user_data que influenciam o prompt (o nome é ignorado de propósito:
+# não muda o plano e impediria o reaproveitamento entre usuários)
+CACHE_KEY_FIELDS = ('age', 'weight', 'height', 'goal', 'budget_per_meal', 'dietary_restrictions')
+CACHE_KEY_VERSION = 'v1'
+# Intervalo mínimo (s) entre limpezas das entradas vencidas no banco
+PURGE_INTERVAL = 300
+
+
+def _normalize_value(value):
+    """Normaliza um valor do perfil para compor a chave do cache"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        text = ' '.join(value.strip().lower().split())
+        if not text or text in ('nenhuma', 'nenhum', 'none'):
+            return None
+        return text
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 1)
+    return str(value)
+
+
+def make_cache_key(user_data: Dict[str, Any]) -> str:
+    """Gera uma chave estável a partir dos dados usados em _create_diet_prompt"""
+    normalized = {field: _normalize_value(user_data.get(field)) for field in CACHE_KEY_FIELDS}
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f"{CACHE_KEY_VERSION}:{digest}"
+
+
+class PlanCache:
+    """Cache de planos gerados: LRU com TTL em memória + camada opcional no banco"""
+
+    def __init__(self, maxsize: int = None, ttl: int = None, db_enabled: bool = None):
+        self.maxsize = maxsize or int(os.getenv('PLAN_CACHE_SIZE', 512))
+        self.ttl = ttl or int(os.getenv('PLAN_CACHE_TTL', 3600))
+        if db_enabled is None:
+            db_enabled = os.getenv('PLAN_CACHE_DB', '0').lower() in ('1', 'true', 'yes')
+        self.db_enabled = db_enabled
+        self.enabled = os.getenv('PLAN_CACHE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+
+        self._memory = TTLCache(maxsize=self.maxsize, ttl=self.ttl)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+        self._purged_at = float('-inf')
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Busca um plano no cache (memória primeiro, depois banco)"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            plan = self._memory.get(key)
+            if plan is not None:
+                self._stats['hits'] += 1
+                return copy.deepcopy(plan)
+
+        if self.db_enabled:
+            plan = self._db_get(key)
+            if plan is not None:
+                with self._lock:
+                    self._memory[key] = plan
+                    self._stats['db_hits'] += 1
+                return copy.deepcopy(plan)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, plan: Dict[str, Any]):
+        """Armazena um plano no cache"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._memory[key] = copy.deepcopy(plan)
+            self._stats['stores'] += 1
+
+        if self.db_enabled:
+            self._db_set(key, plan)
+
+    def clear(self):
+        """Limpa a camada em memória"""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contadores de acerto/erro do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._memory)
+        lookups = stats['hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['db_hits']) / lookups * 100, 1) if lookups else 0
+        stats['ttl'] = self.ttl
+        stats['maxsize'] = self.maxsize
+        stats['db_enabled'] = self.db_enabled
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _db_get(self, key: str) -> Optional[Dict[str, Any]]:
+        from src.models.nutriai_models import db, PlanCacheEntry
+
+        try:
+            entry = PlanCacheEntry.query.filter_by(cache_key=key).first()
+            if not entry:
+                return None
+            if entry.expires_at and entry.expires_at < datetime.utcnow():
+                return None
+            return json.loads(entry.plan)
+        except Exception as e:
+            print(f"Erro ao ler cache de planos no banco: {e}")
+            # No PostgreSQL a transação abortada quebraria a próxima consulta da requisição
+            db.session.rollback()
+            with self._lock:
+                self._stats['errors'] += 1
+            return None
+
+    def _db_set(self, key: str, plan: Dict[str, Any]):
+        from sqlalchemy import text
+        from src.models.nutriai_models import db
+
+        try:
+            now = datetime.utcnow()
+            # Conexão própria: não grava (nem descarta) o que a requisição deixou na sessão
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO plan_cache (cache_key, plan, created_at, expires_at) "
+                    "VALUES (:key, :plan, :now, :expires_at) "
+                    "ON CONFLICT (cache_key) DO UPDATE SET plan = excluded.plan, expires_at = excluded.expires_at"
+                ), {'key': key, 'plan': json.dumps(plan), 'now': now,
+                    'expires_at': now + timedelta(seconds=self.ttl)})
+                if time.monotonic() - self._purged_at >= PURGE_INTERVAL:
+                    # _db_get só ignora entradas vencidas; sem isto a tabela cresceria para sempre
+                    self._purged_at = time.monotonic()
+                    conn.execute(text("DELETE FROM plan_cache WHERE expires_at < :now"), {'now': now})
+        except Exception as e:
+            print(f"Erro ao gravar cache de planos no banco: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
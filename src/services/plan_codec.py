@@ -0,0 +1,204 @@
+"""
+Codec de compressão para o corpo dos planos (DietPlan.ai_plan).
+
+Formato: b'NP' + versão (1 byte) + codec (1 byte) + id do dicionário (4 bytes)
++ dados comprimidos. O id do dicionário é o crc32 do seu conteúdo, então um
+dicionário treinado precisa continuar disponível enquanto houver linhas
+comprimidas com ele.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Any, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'NP'
+FORMAT_VERSION = 1
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODECS = {'zlib': CODEC_ZLIB, 'zstd': CODEC_ZSTD}
+HEADER = struct.Struct('>2sBBI')
+MAX_DICT_SIZE = 32 * 1024  # janela do zlib
+
+# Dicionário embutido: trechos recorrentes dos planos. NÃO ALTERE — linhas já
+# comprimidas dependem dele; para evoluir, treine um novo com train_dictionary.
+BUILTIN_DICT = (
+    '"nutritionist_notes": "Plano focado em perda de peso com déficit calórico controlado. '
+    'Rico em proteínas para preservar massa muscular. Plano equilibrado para manutenção ou ganho de peso '
+    'saudável. Boa distribuição de macronutrientes.", "total_macros": {"protein": , "carbs": , "fat": }, '
+    '"total_calories": , "total_cost": , "preparation": "Grelhar o frango, cozinhar arroz e feijão, '
+    'preparar salada, refogar legumes, assar batata doce, temperar salada, bater tudo no liquidificador '
+    'até ficar homogêneo", "foods": ["Peito de frango (150g)", "Arroz integral (100g)", "Feijão (80g)", '
+    '"Salada mista (100g)", "Ovos (2 unidades)", "Aveia (40g)", "Banana (1 unidade)", "Leite (200ml)", '
+    '"Iogurte natural (150g)", "Granola (30g)", "Batata doce (150g)", "Brócolis (100g)", "Cenoura (50g)", '
+    '"Tomate (80g)", "Azeite de oliva (1 colher)"], "estimated_cost": , "calories": , '
+    '"macros": {"protein": , "carbs": , "fat": }, "description": "Refeição com ", '
+    '"snack": {"description": "Lanche ", "dinner": {"description": "Jantar ", '
+    '"lunch": {"description": "Almoço ", "breakfast": {"description": "Café da manhã '
+).encode('utf-8')
+
+
+def dict_id(dictionary: bytes) -> int:
+    return zlib.crc32(dictionary) & 0xffffffff
+
+
+def _load_dictionaries() -> Dict[int, bytes]:
+    """Dicionário embutido mais os treinados listados em PLAN_CODEC_DICT_PATH"""
+    dictionaries = {dict_id(BUILTIN_DICT): BUILTIN_DICT}
+    for path in filter(None, os.getenv('PLAN_CODEC_DICT_PATH', '').split(',')):
+        with open(path.strip(), 'rb') as f:
+            data = f.read()
+        dictionaries[dict_id(data)] = data
+    return dictionaries
+
+
+class PlanCodec:
+    """Codifica/decodifica planos comprimidos com dicionário compartilhado"""
+
+    def __init__(self, codec: str = None):
+        codec = (codec or os.getenv('PLAN_STORAGE_CODEC', 'none')).lower()
+        if codec == 'zstd' and zstandard is None:
+            print("⚠️ zstandard não instalado. Usando zlib para comprimir planos.")
+            codec = 'zlib'
+        self.codec = codec if codec in CODECS else None
+        self.dictionaries = _load_dictionaries()
+
+        # O primeiro dicionário treinado configurado é o usado para gravar
+        paths = [p for p in os.getenv('PLAN_CODEC_DICT_PATH', '').split(',') if p.strip()]
+        if paths:
+            with open(paths[0].strip(), 'rb') as f:
+                self.current_dict = f.read()
+        else:
+            self.current_dict = BUILTIN_DICT
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec is not None
+
+    def encode(self, plan_dict: Dict[str, Any]) -> bytes:
+        raw = json.dumps(plan_dict, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        codec_id = CODECS[self.codec or 'zlib']
+
+        if codec_id == CODEC_ZSTD:
+            compressor = zstandard.ZstdCompressor(
+                level=int(os.getenv('PLAN_CODEC_LEVEL', 9)),
+                dict_data=zstandard.ZstdCompressionDict(self.current_dict)
+            )
+            payload = compressor.compress(raw)
+        else:
+            compressor = zlib.compressobj(int(os.getenv('PLAN_CODEC_LEVEL', 9)), zdict=self.current_dict)
+            payload = compressor.compress(raw) + compressor.flush()
+
+        return HEADER.pack(MAGIC, FORMAT_VERSION, codec_id, dict_id(self.current_dict)) + payload
+
+    def decode(self, blob: bytes) -> Dict[str, Any]:
+        blob = bytes(blob)
+        magic, version, codec_id, blob_dict_id = HEADER.unpack_from(blob)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Formato de plano comprimido desconhecido')
+
+        dictionary = self.dictionaries.get(blob_dict_id)
+        if dictionary is None:
+            raise ValueError(f'Dicionário {blob_dict_id:08x} não encontrado (PLAN_CODEC_DICT_PATH)')
+
+        payload = blob[HEADER.size:]
+        if codec_id == CODEC_ZSTD:
+            decompressor = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary))
+            raw = decompressor.decompress(payload)
+        else:
+            decompressor = zlib.decompressobj(zdict=dictionary)
+            raw = decompressor.decompress(payload) + decompressor.flush()
+
+        return json.loads(raw)
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICT_SIZE) -> bytes:
+    """
+    Treina um dicionário a partir de planos existentes (JSON em texto).
+    Usa o treinador do zstd quando disponível; senão monta um dicionário
+    zlib com os fragmentos mais frequentes, os mais comuns no final.
+    """
+    samples = [s.encode('utf-8') if isinstance(s, str) else s for s in samples]
+
+    if zstandard is not None and len(samples) >= 10:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+    # Fragmentos: chaves e valores de texto separados pela sintaxe JSON
+    fragments = Counter()
+    for sample in samples:
+        for piece in sample.replace(b'{', b'\n').replace(b'}', b'\n').replace(b',"', b'\n"').split(b'\n'):
+            if len(piece) >= 4:
+                fragments[piece] += 1
+
+    ranked = sorted(fragments.items(), key=lambda item: item[1] * len(item[0]))
+    dictionary = bytearray()
+    for piece, count in reversed(ranked):
+        if count < 2 or len(dictionary) + len(piece) > size:
+            continue
+        dictionary[:0] = piece
+    return bytes(dictionary) or BUILTIN_DICT
+
+
+def backfill_compressed_plans(codec: PlanCodec, batch_size: int = 500, log=print) -> Dict[str, Any]:
+    """
+    Converte em lotes os planos ainda não comprimidos. Retorna o total de
+    linhas, a taxa de compressão e o custo médio de decodificação por linha.
+    """
+    from src.models.nutriai_models import db, DietPlan
+
+    rows = raw_bytes = compressed_bytes = 0
+    decode_seconds = 0.0
+    last_id = 0
+
+    while True:
+        plans = (DietPlan.query
+                 .filter(DietPlan.id > last_id, DietPlan.ai_plan_blob.is_(None))
+                 .order_by(DietPlan.id)
+                 .limit(batch_size)
+                 .all())
+        if not plans:
+            break
+
+        for plan in plans:
+            plan_dict = plan.get_ai_plan()
+            blob = codec.encode(plan_dict)
+
+            start = time.perf_counter()
+            codec.decode(blob)
+            decode_seconds += time.perf_counter() - start
+
+            raw_bytes += len(json.dumps(plan_dict, ensure_ascii=False).encode('utf-8'))
+            compressed_bytes += len(blob)
+            plan.ai_plan = None
+            plan.ai_plan_blob = blob
+
+        db.session.commit()
+        rows += len(plans)
+        last_id = plans[-1].id
+        log(f"  {rows} planos comprimidos")
+
+    return {
+        'rows': rows,
+        'raw_bytes': raw_bytes,
+        'compressed_bytes': compressed_bytes,
+        'ratio': round(raw_bytes / compressed_bytes, 2) if compressed_bytes else 0,
+        'decode_us_per_row': round(decode_seconds / rows * 1e6, 1) if rows else 0
+    }
+
+
+_codec: Optional[PlanCodec] = None
+
+
+def get_codec() -> PlanCodec:
+    """Instância do codec criada na primeira utilização"""
+    global _codec
+    if _codec is None:
+        _codec = PlanCodec()
+    return _codec
@@ -0,0 +1,209 @@
+"""
+Índice em memória dos planos aprovados pelos nutricionistas, para
+reaproveitá-los em perfis parecidos sem nova chamada à IA.
+
+Objetivo e restrições alimentares precisam coincidir (mesmos termos
+normalizados, em qualquer ordem); idade, peso, altura e orçamento viram um
+vetor NumPy em unidades de tolerância, e o plano mais próximo só é usado
+se a distância ficar abaixo de PLAN_REUSE_MAX_DISTANCE. Aprovações entram
+no índice na hora; a tabela é relida a cada PLAN_REUSE_REFRESH_SECONDS
+(aprovações feitas por outros workers).
+"""
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.services.nutrition import normalize_name
+
+# Termos que não mudam o sentido do objetivo / das restrições
+STOP_WORDS = {'a', 'o', 'as', 'os', 'de', 'do', 'da', 'dos', 'das', 'e', 'com', 'sem', 'para', 'ao', 'um', 'uma'}
+EMPTY_TERMS = {'nenhuma', 'nenhum', 'none', 'nada'}
+
+# Diferença que vale 1 na distância: 5 anos, 5 kg, 5 cm e 15% do orçamento
+FEATURE_SCALES = np.array([5.0, 5.0, 5.0, math.log(1.15)])
+
+
+def terms(text: Optional[str]) -> Tuple[str, ...]:
+    """Termos normalizados (sem acentos, ordem e palavras de ligação)"""
+    words = set(normalize_name(text or '').split()) - STOP_WORDS
+    if words <= EMPTY_TERMS:
+        return ()
+    return tuple(sorted(words))
+
+
+def profile_key(goal: Optional[str], restrictions: Optional[str]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    return terms(goal), terms(restrictions)
+
+
+def profile_vector(age, weight, height, budget) -> np.ndarray:
+    """Vetor escalado do perfil; valores ausentes ficam NaN"""
+    def number(value):
+        try:
+            return float(value) if value is not None else math.nan
+        except (TypeError, ValueError):
+            return math.nan
+
+    budget = number(budget)
+    budget = math.log(budget) if budget > 0 else math.nan
+    return np.array([number(age), number(weight), number(height), budget]) / FEATURE_SCALES
+
+
+class ApprovedPlanIndex:
+    def __init__(self, max_distance: float = None, refresh_interval: float = None):
+        self.enabled = os.getenv('PLAN_REUSE_ENABLED', '1') == '1'
+        self.max_distance = max_distance if max_distance is not None else \
+            float(os.getenv('PLAN_REUSE_MAX_DISTANCE', 1.0))
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            float(os.getenv('PLAN_REUSE_REFRESH_SECONDS', 600))
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # (termos do objetivo, termos das restrições) -> (ids dos planos, matriz de vetores)
+        self._groups: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+        self._plans: Dict[int, Tuple] = {}
+        # Aprovações recentes, reaplicadas se uma releitura em andamento não as viu
+        self._recent: Dict[int, Tuple] = {}
+        self.loaded_at = 0.0
+        self._stale = False
+        self._stats = {'lookups': 0, 'matches': 0, 'added': 0, 'removed': 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at > 0
+
+    def _add(self, plan_id: int, key: Tuple, vector: np.ndarray):
+        if plan_id in self._plans:
+            self._remove(plan_id)
+        ids, vectors = self._groups.get(key, (np.zeros(0, dtype=np.int64), np.zeros((0, len(FEATURE_SCALES)))))
+        self._groups[key] = (np.append(ids, plan_id), np.vstack([vectors, vector]))
+        self._plans[plan_id] = key
+
+    def _remove(self, plan_id: int):
+        key = self._plans.pop(plan_id, None)
+        if key is None:
+            return
+        ids, vectors = self._groups[key]
+        keep = ids != plan_id
+        if keep.any():
+            self._groups[key] = (ids[keep], vectors[keep])
+        else:
+            del self._groups[key]
+
+    def refresh(self) -> int:
+        """Relê os planos aprovados (perfil atual do dono de cada plano)"""
+        from src.models.nutriai_models import DietPlan, User
+
+        started = time.monotonic()
+        rows = DietPlan.query.join(User, User.id == DietPlan.user_id).with_entities(
+            DietPlan.id, DietPlan.goal, DietPlan.dietary_restrictions, User.age, User.weight, User.height,
+            DietPlan.budget_per_meal
+        ).filter(DietPlan.status == 'approved').all()
+        self.load_rows(rows, started)
+        return len(rows)
+
+    def load_rows(self, rows, started: float = None):
+        """Substitui o índice por (id, objetivo, restrições, idade, peso, altura, orçamento)"""
+        started = started if started is not None else time.monotonic()
+        grouped: Dict[Tuple, Tuple[list, list]] = {}
+        plans, keys = {}, {}
+        for plan_id, goal, restrictions, age, weight, height, budget in rows:
+            key = keys.get((goal, restrictions))
+            if key is None:
+                key = keys[goal, restrictions] = profile_key(goal, restrictions)
+            ids, vectors = grouped.setdefault(key, ([], []))
+            ids.append(plan_id)
+            vectors.append(profile_vector(age, weight, height, budget))
+            plans[plan_id] = key
+
+        groups = {key: (np.array(ids, dtype=np.int64), np.vstack(vectors)) for key, (ids, vectors) in grouped.items()}
+        with self._lock:
+            self._groups, self._plans = groups, plans
+            self._recent = {plan_id: entry for plan_id, entry in self._recent.items() if entry[2] >= started}
+            for plan_id, (key, vector, _) in self._recent.items():
+                self._add(plan_id, key, vector)
+            self.loaded_at = time.monotonic()
+
+    def _due(self) -> bool:
+        return not self.loaded or self._stale or time.monotonic() - self.loaded_at >= self.refresh_interval
+
+    def refresh_if_due(self):
+        if not self._due():
+            return
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if self._due():
+                self._stale = False
+                self.refresh()
+        except Exception as e:
+            # Sem contexto de aplicação ou tabela ainda não criada
+            print(f"⚠️ Índice de planos aprovados não atualizado: {e}")
+            self.loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self):
+        """Força a releitura da tabela na próxima consulta"""
+        self._stale = True
+
+    def add_plan(self, plan):
+        """Inclui um plano recém-aprovado (DietPlan) sem reler a tabela"""
+        if not self.enabled:
+            return
+        user = plan.user
+        vector = profile_vector(user.age, user.weight, user.height, plan.budget_per_meal)
+        key = profile_key(plan.goal, plan.dietary_restrictions)
+        with self._lock:
+            self._add(plan.id, key, vector)
+            self._recent[plan.id] = (key, vector, time.monotonic())
+            self._stats['added'] += 1
+
+    def remove(self, plan_id: int):
+        """Tira do índice um plano que não pode mais ser usado"""
+        with self._lock:
+            self._remove(plan_id)
+            self._recent.pop(plan_id, None)
+            self._stats['removed'] += 1
+
+    def lookup(self, user_data: Dict[str, Any]) -> Optional[Tuple[int, float]]:
+        """(id do plano aprovado mais próximo, distância) ou None se nenhum estiver perto o bastante"""
+        if not self.enabled:
+            return None
+        self.refresh_if_due()
+
+        key = profile_key(user_data.get('goal'), user_data.get('dietary_restrictions'))
+        query = profile_vector(user_data.get('age'), user_data.get('weight'), user_data.get('height'),
+                               user_data.get('budget_per_meal'))
+        with self._lock:
+            self._stats['lookups'] += 1
+            ids, vectors = self._groups.get(key, (None, None))
+        if ids is None:
+            return None
+
+        diff = vectors - query
+        # Campo ausente nos dois perfis não pesa; ausente em só um deles impede o uso
+        both_missing = np.isnan(vectors) & np.isnan(query)
+        diff = np.where(both_missing, 0.0, np.nan_to_num(diff, nan=np.inf))
+        distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        best = int(np.argmin(distances))
+        if not distances[best] <= self.max_distance:
+            return None
+        with self._lock:
+            self._stats['matches'] += 1
+        return int(ids[best]), float(distances[best])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['plans'] = len(self._plans)
+            stats['groups'] = len(self._groups)
+        stats['enabled'] = self.enabled
+        stats['max_distance'] = self.max_distance
+        stats['match_rate'] = round(stats['matches'] / stats['lookups'], 4) if stats['lookups'] else 0
+        return stats
+
+
+approved_plan_index = ApprovedPlanIndex()
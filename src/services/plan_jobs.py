@@ -0,0 +1,136 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+
+class PlanJobQueue:
+    """Fila limitada de geração de planos em segundo plano"""
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, stale_after: float = None):
+        self.max_workers = max_workers or int(os.getenv('PLAN_JOB_WORKERS', 4))
+        self.max_pending = max_pending or int(os.getenv('PLAN_JOB_QUEUE_SIZE', 32))
+        self.stale_after = stale_after or float(os.getenv('PLAN_JOB_STALE_SECONDS', 600))
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'running': 0, 'expired': 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Criado sob demanda para não abrir threads em processos que não usam a fila
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='plan-job')
+            return self._executor
+
+    def submit(self, app, plan_id: int, user_data: Dict[str, Any]) -> bool:
+        """Agenda a geração do plano; retorna False se a fila estiver cheia"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            return False
+
+        try:
+            self._get_executor().submit(self._run, app, plan_id, user_data)
+        except Exception as e:
+            # Executor encerrado (desligamento do processo): devolve a vaga
+            print(f"Erro ao agendar a geração do plano {plan_id}: {e}")
+            self._slots.release()
+            with self._lock:
+                self._stats['rejected'] += 1
+            return False
+
+        with self._lock:
+            self._stats['submitted'] += 1
+        return True
+
+    def _run(self, app, plan_id: int, user_data: Dict[str, Any]):
+        from src.models.nutriai_models import db, DietPlan
+        from src.services.gemini_service import gemini_service
+
+        with self._lock:
+            self._stats['running'] += 1
+        try:
+            with app.app_context():
+                try:
+                    ai_plan = gemini_service.generate_diet_plan(user_data)
+
+                    plan = DietPlan.query.get(plan_id)
+                    if plan is None:
+                        return
+                    plan.set_ai_plan(ai_plan)
+                    plan.status = 'pending'
+                    db.session.commit()
+
+                    with self._lock:
+                        self._stats['completed'] += 1
+
+                except Exception as e:
+                    print(f"Erro no job de geração do plano {plan_id}: {e}")
+                    db.session.rollback()
+                    self._mark_failed(plan_id, str(e))
+        finally:
+            with self._lock:
+                self._stats['running'] -= 1
+            self._slots.release()
+
+    def _mark_failed(self, plan_id: int, error: str):
+        from src.models.nutriai_models import db, DietPlan
+
+        with self._lock:
+            self._stats['failed'] += 1
+        try:
+            plan = DietPlan.query.get(plan_id)
+            if plan is not None:
+                plan.status = 'failed'
+                plan.set_ai_plan({'error': f'Falha na geração: {error}'})
+                db.session.commit()
+        except Exception as e:
+            print(f"Erro ao marcar plano {plan_id} como falho: {e}")
+            db.session.rollback()
+
+    def is_stale(self, plan) -> bool:
+        """Plano em 'generating' há mais de PLAN_JOB_STALE_SECONDS"""
+        return (
+            plan.status == 'generating' and plan.created_at is not None
+            and plan.created_at < datetime.utcnow() - timedelta(seconds=self.stale_after)
+        )
+
+    def expire_stale(self, plan_ids: List[int] = None) -> int:
+        """
+        Marca como 'failed' os planos presos em 'generating' (worker morto ou
+        processo reiniciado com o job na fila); retorna quantos foram marcados
+        """
+        from src.models.nutriai_models import db, DietPlan
+
+        failed = DietPlan()
+        failed.set_ai_plan({'error': 'Geração interrompida, tente novamente'})
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        query = DietPlan.query.filter(DietPlan.status == 'generating', DietPlan.created_at < cutoff)
+        if plan_ids is not None:
+            query = query.filter(DietPlan.id.in_(plan_ids))
+        # UPDATE condicionado ao status: um job que terminou no meio tempo não é sobrescrito
+        expired = query.update({
+            'status': 'failed',
+            'ai_plan': failed.ai_plan,
+            'ai_plan_blob': failed.ai_plan_blob
+        }, synchronize_session=False)
+        db.session.commit()
+
+        with self._lock:
+            self._stats['expired'] += expired
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contadores da fila"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_workers'] = self.max_workers
+        stats['max_pending'] = self.max_pending
+        stats['stale_after_seconds'] = self.stale_after
+        return stats
+
+
+# Instância global da fila
+plan_job_queue = PlanJobQueue()
@@ -0,0 +1,186 @@
+"""
+Leitura tolerante das respostas da IA.
+
+Antes de descartar uma resposta (já paga), tenta em ordem: JSON puro, JSON
+com defeitos comuns corrigidos (cercas de código, texto em volta, vírgulas
+sobrando, aspas tipográficas, literais do Python), JSON truncado fechado no
+último valor completo e, por fim, as refeições completas encontradas pelo
+parser incremental. O resultado diz quais refeições faltam, para que só
+elas sejam pedidas de novo.
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+from src.services.json_stream import IncrementalObjectParser
+
+MEAL_KEYS = ('breakfast', 'lunch', 'dinner', 'snack')
+MEAL_NAMES = {'breakfast': 'café da manhã', 'lunch': 'almoço', 'dinner': 'jantar', 'snack': 'lanche'}
+
+_MEAL_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'description': {'type': 'STRING'},
+        'foods': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'preparation': {'type': 'STRING'},
+        'estimated_cost': {'type': 'NUMBER'},
+        'calories': {'type': 'NUMBER'},
+        'macros': {
+            'type': 'OBJECT',
+            'properties': {'protein': {'type': 'NUMBER'}, 'carbs': {'type': 'NUMBER'}, 'fat': {'type': 'NUMBER'}},
+            'required': ['protein', 'carbs', 'fat']
+        }
+    },
+    'required': ['description', 'foods', 'preparation', 'estimated_cost', 'calories', 'macros']
+}
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_PYTHON_LITERALS = re.compile(r'\b(True|False|None|NaN)\b')
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null', 'NaN': 'null'}
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"'})
+
+
+def plan_schema(meals=MEAL_KEYS, totals: bool = True) -> Dict[str, Any]:
+    """Schema da resposta (response_schema do Gemini) com as refeições pedidas"""
+    properties = {meal: _MEAL_SCHEMA for meal in meals}
+    if totals:
+        properties.update({
+            'total_cost': {'type': 'NUMBER'},
+            'total_calories': {'type': 'NUMBER'},
+            'total_macros': _MEAL_SCHEMA['properties']['macros'],
+            'nutritionist_notes': {'type': 'STRING'}
+        })
+    return {'type': 'OBJECT', 'properties': properties, 'required': list(meals)}
+
+
+def _strip_wrapping(text: str) -> str:
+    """Remove cercas de código e o texto antes do primeiro '{' e depois do último '}'"""
+    text = text.strip()
+    text = re.sub(r'^```(?:json)?\s*', '', text)
+    text = re.sub(r'\s*```\s*$', '', text)
+    start = text.find('{')
+    if start < 0:
+        return text
+    end = text.rfind('}')
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def _fix_defects(text: str) -> str:
+    text = text.translate(_SMART_QUOTES)
+    text = _PYTHON_LITERALS.sub(lambda match: _LITERALS[match.group(1)], text)
+    return _TRAILING_COMMA.sub(r'\1', text)
+
+
+def _close_truncated(text: str) -> str:
+    """Corta no último objeto/lista fechado e fecha os que ficaram abertos"""
+    stack, in_string, escape = [], False, False
+    cut, cut_stack = None, None
+    for position, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+            cut, cut_stack = position + 1, list(stack)
+    if cut is None:
+        raise ValueError('Resposta sem nenhum objeto completo')
+    return _TRAILING_COMMA.sub(r'\1', text[:cut].rstrip().rstrip(',') + ''.join(reversed(cut_stack)))
+
+
+def is_valid_meal(data: Any) -> bool:
+    """Refeição utilizável (uma refeição cortada no meio não passa: faltam preparo ou macros)"""
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get('description'), str)
+        and isinstance(data.get('preparation'), str)
+        and isinstance(data.get('macros'), dict)
+        and isinstance(data.get('foods'), list) and bool(data['foods'])
+        and all(isinstance(item, str) for item in data['foods'])
+    )
+
+
+def decode_plan(text: str, meals=MEAL_KEYS) -> Tuple[Dict[str, Any], List[str], str]:
+    """
+    Retorna (plano, refeições faltando, como foi lido: 'parsed', 'repaired'
+    ou 'salvaged'); levanta ValueError se nada puder ser aproveitado
+    """
+    body = _strip_wrapping(text or '')
+    # Texto ou cercas em volta do JSON também contam como defeito
+    plan, outcome = None, 'parsed' if body == (text or '').strip() else 'repaired'
+    try:
+        plan = json.loads(body)
+    except ValueError:
+        outcome = 'repaired'
+        fixed = _fix_defects(body)
+        for candidate in (lambda: fixed, lambda: _close_truncated(fixed)):
+            try:
+                plan = json.loads(candidate())
+                break
+            except ValueError:
+                continue
+
+    if not isinstance(plan, dict):
+        # Último recurso: refeições completas, uma a uma
+        outcome = 'salvaged'
+        plan = dict(IncrementalObjectParser(meals).feed(_fix_defects(body)))
+
+    missing = [meal for meal in meals if not is_valid_meal(plan.get(meal))]
+    for meal in missing:
+        plan.pop(meal, None)
+    if len(missing) == len(meals):
+        raise ValueError('Nenhuma refeição válida na resposta da IA')
+    if missing:
+        outcome = 'salvaged'
+    return plan, missing, outcome
+
+
+def recompute_totals(plan: Dict[str, Any], meals=MEAL_KEYS) -> Dict[str, Any]:
+    """Totais do plano refeitos a partir das refeições (plano montado de partes)"""
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    selected = [plan[meal] for meal in meals if meal in plan]
+    plan['total_cost'] = round(sum(number(meal.get('estimated_cost')) for meal in selected), 2)
+    plan['total_calories'] = int(round(sum(number(meal.get('calories')) for meal in selected)))
+    plan['total_macros'] = {
+        macro: round(sum(number((meal.get('macros') or {}).get(macro)) for meal in selected), 1)
+        for macro in ('protein', 'carbs', 'fat')
+    }
+    return plan
+
+
+class ParseStats:
+    """Contadores de leitura das respostas da IA (taxa de falha nas métricas)"""
+
+    OUTCOMES = ('parsed', 'repaired', 'salvaged', 'failed')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {outcome: 0 for outcome in self.OUTCOMES}
+        self._stats.update({'meals_regenerated': 0, 'meals_filled_locally': 0})
+
+    def record(self, outcome: str, count: int = 1):
+        with self._lock:
+            self._stats[outcome] += count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        responses = sum(stats[outcome] for outcome in self.OUTCOMES)
+        stats['responses'] = responses
+        stats['failure_rate'] = round(stats['failed'] / responses, 4) if responses else 0
+        stats['defect_rate'] = round((responses - stats['parsed']) / responses, 4) if responses else 0
+        return stats
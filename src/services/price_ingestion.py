@@ -0,0 +1,179 @@
+"""
+Importação em massa de preços (FoodPrice) a partir de CSV ou NDJSON.
+
+O arquivo é lido em streaming e gravado em lotes com upsert na chave
+(food_name, supermarket, location): COPY para uma tabela temporária no
+PostgreSQL, executemany com ON CONFLICT no SQLite. A memória usada depende
+apenas do tamanho do lote, não do arquivo.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+
+FIELDS = ('food_name', 'price_per_unit', 'unit', 'supermarket', 'location', 'updated_at')
+FORMATS = ('csv', 'ndjson')
+
+_UPSERT_SQL = (
+    "INSERT INTO food_prices (food_name, price_per_unit, unit, supermarket, location, updated_at) "
+    "{source} "
+    "ON CONFLICT (food_name, supermarket, location) DO UPDATE SET "
+    "price_per_unit = excluded.price_per_unit, unit = excluded.unit, updated_at = excluded.updated_at"
+)
+
+
+class PriceRecordError(ValueError):
+    """Linha inválida no arquivo de preços"""
+
+
+def detect_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    """Formato pelo nome do arquivo ou Content-Type (padrão: csv)"""
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Lê o arquivo registro a registro, sem carregá-lo inteiro. Retorna
+    (linha no arquivo, registro), contando cabeçalho e linhas em branco.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Formato inválido: {fmt}')
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # line_num do leitor: linha física (campos com quebra de linha terminam nela)
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def normalize_record(record: Dict[str, Any], now: datetime) -> Tuple:
+    """Valida e converte um registro na tupla de FIELDS"""
+    if not isinstance(record, dict):
+        raise PriceRecordError('Registro inválido')
+    food_name = (record.get('food_name') or '').strip()
+    unit = (record.get('unit') or '').strip()
+    if not food_name:
+        raise PriceRecordError('food_name é obrigatório')
+    if not unit:
+        raise PriceRecordError('unit é obrigatório')
+
+    price = record.get('price_per_unit')
+    try:
+        price = float(str(price).replace(',', '.')) if isinstance(price, str) else float(price)
+    except (TypeError, ValueError):
+        raise PriceRecordError(f'price_per_unit inválido: {price!r}')
+    if price <= 0:
+        raise PriceRecordError(f'price_per_unit inválido: {price!r}')
+
+    return (
+        food_name[:100],
+        price,
+        unit[:20],
+        (record.get('supermarket') or '').strip()[:50],
+        (record.get('location') or '').strip()[:100],
+        now
+    )
+
+
+def _upsert_sqlite(conn, rows: List[Tuple]):
+    conn.exec_driver_sql(_UPSERT_SQL.format(source="VALUES (?, ?, ?, ?, ?, ?)"), rows)
+
+
+def _upsert_postgresql(conn, rows: List[Tuple]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row[:5] + (row[5].isoformat(),))
+    buffer.seek(0)
+
+    conn.exec_driver_sql(
+        "CREATE TEMP TABLE IF NOT EXISTS food_prices_stage ("
+        "food_name TEXT, price_per_unit DOUBLE PRECISION, unit TEXT, "
+        "supermarket TEXT, location TEXT, updated_at TIMESTAMP, row_position BIGSERIAL)"
+    )
+    conn.exec_driver_sql("TRUNCATE food_prices_stage")
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY food_prices_stage ({', '.join(FIELDS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    # Um mesmo lote pode repetir a chave: a última linha do arquivo vence
+    conn.exec_driver_sql(_UPSERT_SQL.format(source=(
+        "SELECT DISTINCT ON (food_name, supermarket, location) "
+        "food_name, price_per_unit, unit, supermarket, location, updated_at "
+        "FROM food_prices_stage "
+        "ORDER BY food_name, supermarket, location, row_position DESC"
+    )))
+
+
+def ingest_prices(engine, stream: IO[str], fmt: str = 'csv', batch_size: int = None,
+                  max_errors: int = 20, log=print) -> Dict[str, Any]:
+    """
+    Importa os preços do arquivo em lotes (uma transação por lote).
+    Linhas inválidas são contadas e ignoradas; retorna o relatório.
+    """
+    batch_size = batch_size or int(os.getenv('PRICE_IMPORT_BATCH_SIZE', 5000))
+    upsert = _upsert_postgresql if engine.dialect.name == 'postgresql' else _upsert_sqlite
+
+    rows = rejected = batches = 0
+    errors = []
+    started = time.perf_counter()
+    records = iter_records(stream, fmt)
+
+    while True:
+        chunk = list(itertools.islice(records, batch_size))
+        if not chunk:
+            break
+
+        # Um updated_at por lote: o índice de nomes acompanha a importação em andamento
+        now = datetime.utcnow()
+        batch = []
+        for line, record in chunk:
+            try:
+                batch.append(normalize_record(record, now))
+            except PriceRecordError as e:
+                rejected += 1
+                if len(errors) < max_errors:
+                    errors.append({'line': line, 'error': str(e)})
+
+        if batch:
+            with engine.begin() as conn:
+                upsert(conn, batch)
+        rows += len(batch)
+        batches += 1
+        log(f"  {rows} preços importados")
+
+    elapsed = time.perf_counter() - started
+
+    # Os preços usados no cálculo dos planos passam a refletir a importação
+    from src.services.food_index import food_name_index
+    from src.services.nutrition import get_nutrition_engine
+    food_name_index.invalidate()
+    get_nutrition_engine().invalidate_prices()
+
+    return {
+        'rows': rows,
+        'rejected': rejected,
+        'errors': errors,
+        'batches': batches,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed) if elapsed else 0
+    }
@@ -0,0 +1,245 @@
+"""
+Cota de chamadas ao Gemini compartilhada entre os workers.
+
+Um balde de tokens único (arquivo com flock ou linha no banco) é
+reabastecido a GEMINI_QUOTA_RPM * GEMINI_QUOTA_TARGET por minuto. Cada
+assinatura tem uma reserva: planos inferiores só levam um token se o balde
+ficar acima da reserva deles, então assinantes 'plus' sempre encontram
+capacidade. Respostas 429 reduzem a vazão (AIMD) em vez de insistir.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+# Da maior para a menor prioridade
+TIERS = ('plus', 'smart', 'free')
+TIER_WAIT_FACTOR = {'plus': 2.0, 'smart': 1.0, 'free': 0.5}
+
+MIN_RATE_FACTOR = 0.2
+RATE_DECREASE = 0.7
+RATE_INCREASE = 0.05
+
+
+def is_quota_error(error: Exception) -> bool:
+    """429 / ResourceExhausted do SDK do Gemini"""
+    text = f"{type(error).__name__} {error}"
+    return 'ResourceExhausted' in text or '429' in text or 'quota' in text.lower()
+
+
+class FileBucketStore:
+    """Estado do balde num arquivo JSON protegido por flock (workers da mesma máquina)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def update(self, fn: Callable[[Dict[str, float]], Dict[str, float]]) -> Dict[str, float]:
+        import fcntl
+
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = fn(json.loads(raw) if raw else {})
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return state
+
+
+class DatabaseBucketStore:
+    """Estado do balde na tabela quota_buckets, com a linha travada durante a atualização"""
+
+    def __init__(self, name: str = 'gemini'):
+        self.name = name
+
+    def update(self, fn: Callable[[Dict[str, float]], Dict[str, float]]) -> Dict[str, float]:
+        from sqlalchemy import text
+        from src.models.nutriai_models import db
+
+        with db.engine.begin() as conn:
+            params = {'name': self.name}
+            # UPDATE sem efeito trava a linha (PostgreSQL) ou o banco (SQLite) antes da leitura
+            locked = conn.execute(text("UPDATE quota_buckets SET tokens = tokens WHERE name = :name"), params)
+            if not locked.rowcount:
+                conn.execute(text(
+                    "INSERT INTO quota_buckets (name, tokens, rate_factor, updated) VALUES (:name, 0, 1, 0) "
+                    "ON CONFLICT (name) DO NOTHING"
+                ), params)
+            row = conn.execute(text(
+                "SELECT tokens, rate_factor, updated FROM quota_buckets WHERE name = :name"
+            ), params).one()
+            state = fn({'tokens': row[0], 'factor': row[1], 'updated': row[2]})
+            conn.execute(text(
+                "UPDATE quota_buckets SET tokens = :tokens, rate_factor = :factor, updated = :updated WHERE name = :name"
+            ), {**state, 'name': self.name})
+        return state
+
+
+class QuotaScheduler:
+    def __init__(self, rpm: float = None, target: float = None, burst: float = None, max_wait: float = None,
+                 store=None):
+        self.rpm = rpm if rpm is not None else float(os.getenv('GEMINI_QUOTA_RPM', 0))
+        self.target = target if target is not None else float(os.getenv('GEMINI_QUOTA_TARGET', 0.9))
+        self.burst = burst if burst is not None else float(os.getenv('GEMINI_QUOTA_BURST', 5))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('GEMINI_QUOTA_MAX_WAIT_SECONDS', 5))
+        # Fração do balde que só planos acima deste podem usar
+        self.reserve = {
+            'plus': 0.0,
+            'smart': float(os.getenv('GEMINI_QUOTA_RESERVE_SMART', 0.2)),
+            'free': float(os.getenv('GEMINI_QUOTA_RESERVE_FREE', 0.5)),
+        }
+        self._store = store
+
+        self._tiers = TTLCache(maxsize=4096, ttl=60)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._stats = {tier: {'granted': 0, 'denied': 0} for tier in TIERS}
+        self._stats['throttled'] = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0
+
+    @property
+    def rate(self) -> float:
+        """Tokens por segundo com a margem de GEMINI_QUOTA_TARGET"""
+        return self.rpm * self.target / 60.0
+
+    @property
+    def store(self):
+        if self._store is None:
+            if os.getenv('GEMINI_QUOTA_BACKEND', 'file') == 'database':
+                self._store = DatabaseBucketStore()
+            else:
+                self._store = FileBucketStore(os.getenv('GEMINI_QUOTA_FILE', '/tmp/nutriai-gemini-quota.json'))
+        return self._store
+
+    def tier_for(self, user_id: Optional[int]) -> str:
+        """Plano da assinatura ativa do usuário ('free' sem assinatura)"""
+        if user_id is None:
+            return 'free'
+        tier = self._tiers.get(user_id)
+        if tier is None:
+            from src.models.nutriai_models import Subscription
+
+            now = datetime.utcnow()
+            plan_types = {
+                plan_type for plan_type, end_date in Subscription.query.with_entities(
+                    Subscription.plan_type, Subscription.end_date
+                ).filter(Subscription.user_id == user_id, Subscription.status == 'active')
+                if end_date is None or end_date > now
+            }
+            tier = next((name for name in TIERS if name in plan_types), 'free')
+            self._tiers[user_id] = tier
+        return tier
+
+    def _refill(self, state: Dict[str, float], now: float) -> Dict[str, float]:
+        factor = state.get('factor') or 1.0
+        updated = state.get('updated') or now
+        tokens = state.get('tokens', self.burst) if state.get('updated') else self.burst
+        tokens = min(self.burst, tokens + max(now - updated, 0.0) * self.rate * factor)
+        return {'tokens': tokens, 'factor': factor, 'updated': now}
+
+    def _try_take(self, tier: str):
+        """Tenta levar um token; retorna (conseguiu, segundos até haver um)"""
+        floor = self.reserve[tier] * self.burst
+        result = {}
+
+        def take(state):
+            state = self._refill(state, time.time())
+            if state['tokens'] - 1.0 >= floor:
+                state['tokens'] -= 1.0
+                result['granted'] = True
+            else:
+                result['wait'] = (floor + 1.0 - state['tokens']) / (self.rate * state['factor'])
+            return state
+
+        self.store.update(take)
+        return result.get('granted', False), result.get('wait', 0.0)
+
+    def acquire(self, tier: str) -> bool:
+        """
+        Espera por um token até o limite do plano; dentro do processo, quem
+        tem plano maior (ou chegou antes) é atendido primeiro
+        """
+        if not self.enabled:
+            return True
+
+        deadline = time.monotonic() + self.max_wait * TIER_WAIT_FACTOR[tier]
+        ticket = (TIERS.index(tier), next(self._sequence))
+        granted = False
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    while self._waiting[0] != ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        self._cond.wait(remaining)
+
+                granted, wait_for = self._try_take(tier)
+                remaining = deadline - time.monotonic()
+                if granted or remaining <= 0:
+                    return granted
+                time.sleep(min(wait_for, remaining))
+        finally:
+            with self._cond:
+                self._stats[tier]['granted' if granted else 'denied'] += 1
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def observe(self, error: Exception = None):
+        """Ajusta a vazão pelo resultado da chamada: 429 reduz 30%, sucesso recupera aos poucos"""
+        if not self.enabled:
+            return
+        throttled = error is not None and is_quota_error(error)
+        if error is not None and not throttled:
+            return
+
+        def adjust(state):
+            state = self._refill(state, time.time())
+            if throttled:
+                state['factor'] = max(MIN_RATE_FACTOR, state['factor'] * RATE_DECREASE)
+                state['tokens'] = min(state['tokens'], 0.0)
+            else:
+                state['factor'] = min(1.0, state['factor'] + RATE_INCREASE)
+            return state
+
+        if throttled:
+            with self._cond:
+                self._stats['throttled'] += 1
+        try:
+            self.store.update(adjust)
+        except Exception as e:
+            print(f"⚠️ Cota do Gemini não atualizada: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {tier: dict(self._stats[tier]) for tier in TIERS}
+            stats['throttled'] = self._stats['throttled']
+            stats['waiting'] = len(self._waiting)
+        stats['enabled'] = self.enabled
+        if self.enabled:
+            stats['target_rpm'] = round(self.rpm * self.target, 1)
+            try:
+                state = self.store.update(lambda state: self._refill(state, time.time()))
+                stats['tokens'] = round(state['tokens'], 2)
+                stats['rate_factor'] = round(state['factor'], 3)
+            except Exception as e:
+                stats['error'] = str(e)
+        return stats
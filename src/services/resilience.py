@@ -0,0 +1,231 @@
+"""
+Proteções em volta das chamadas ao Gemini: prazo por chamada, disjuntor
+(circuit breaker) e requisição duplicada (hedge) quando a primeira passa
+do p95 das latências recentes.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+
+class UpstreamUnavailable(Exception):
+    """Disjuntor aberto: a chamada nem é feita"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """A chamada não terminou dentro do prazo"""
+
+
+class LatencyTracker:
+    """Janela das latências mais recentes (chamadas bem-sucedidas)"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            'samples': len(self._samples),
+            'p50_ms': ms(self.percentile(0.5)),
+            'p95_ms': ms(self.percentile(0.95)),
+            'p99_ms': ms(self.percentile(0.99))
+        }
+
+
+class CircuitBreaker:
+    """
+    closed -> open após `failure_threshold` falhas seguidas; depois de
+    `reset_timeout` segundos deixa passar uma chamada de teste (half_open),
+    que fecha o disjuntor se der certo ou o reabre se falhar
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = self.reset_timeout - (time.monotonic() - self.opened_at) if self.state == 'open' else 0
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'retry_in_seconds': round(max(retry_in, 0), 1)
+            }
+
+
+class ResilientCaller:
+    """Executa chamadas com prazo, disjuntor e hedge, acumulando métricas"""
+
+    def __init__(self, name: str, timeout: float = None, hedge: bool = None, hedge_min_delay: float = None,
+                 max_workers: int = None, breaker: CircuitBreaker = None):
+        self.name = name
+        self.timeout = timeout if timeout is not None else float(os.getenv('GEMINI_TIMEOUT_SECONDS', 20))
+        self.hedge = hedge if hedge is not None else os.getenv('GEMINI_HEDGE_ENABLED', '0') == '1'
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else \
+            float(os.getenv('GEMINI_HEDGE_MIN_DELAY_SECONDS', 1.0))
+        self.max_workers = max_workers or int(os.getenv('GEMINI_MAX_CONCURRENCY', 16))
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', 5)),
+            reset_timeout=float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', 30))
+        )
+        self.latency = LatencyTracker()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'successes': 0, 'failures': 0, 'timeouts': 0,
+                       'rejected': 0, 'hedged': 0, 'hedge_wins': 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Chamadas vencidas continuam ocupando a thread até o SDK desistir
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f'{self.name}-call')
+            return self._executor
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes da segunda requisição: p95 recente (None = sem hedge)"""
+        if not self.hedge or len(self.latency) < 20:
+            return None
+        return max(self.latency.percentile(0.95), self.hedge_min_delay)
+
+    def call(self, fn: Callable[[float], Any]) -> Any:
+        """
+        Chama fn(prazo_restante) respeitando o prazo total; levanta
+        UpstreamUnavailable (disjuntor aberto) ou DeadlineExceeded
+        """
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise UpstreamUnavailable(f'{self.name} indisponível (disjuntor aberto)')
+
+        self._count('calls')
+        started = time.monotonic()
+        deadline = started + self.timeout
+        executor = self._get_executor()
+        pending = {executor.submit(fn, self.timeout): 'primary'}
+        hedge_delay = self.hedge_delay()
+        error = None
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            hedge_pending = hedge_delay is not None and len(pending) == 1 and 'hedge' not in pending.values()
+            wait_for = min(remaining, max(hedge_delay - (time.monotonic() - started), 0)) if hedge_pending else remaining
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                origin = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                for other in pending:
+                    other.cancel()
+                self.latency.record(time.monotonic() - started)
+                self.breaker.record_success()
+                self._count('successes')
+                if origin == 'hedge':
+                    self._count('hedge_wins')
+                return result
+
+            if not done and hedge_pending and time.monotonic() < deadline:
+                # A primeira passou do p95: dispara uma segunda e fica com a que terminar antes
+                self._count('hedged')
+                pending[executor.submit(fn, deadline - time.monotonic())] = 'hedge'
+                hedge_delay = None
+
+        self.breaker.record_failure()
+        if pending or error is None:
+            for future in pending:
+                future.cancel()
+            self._count('timeouts')
+            raise DeadlineExceeded(f'{self.name} não respondeu em {self.timeout:.1f}s')
+        self._count('timeouts' if isinstance(error, TimeoutError) else 'failures')
+        raise error
+
+    def guard(self):
+        """Só o disjuntor (para chamadas em streaming, que não passam pelo executor)"""
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise UpstreamUnavailable(f'{self.name} indisponível (disjuntor aberto)')
+        self._count('calls')
+        return time.monotonic()
+
+    def record(self, started: float, ok: bool, timed_out: bool = False):
+        if ok:
+            self.latency.record(time.monotonic() - started)
+            self.breaker.record_success()
+            self._count('successes')
+        else:
+            self.breaker.record_failure()
+            self._count('timeouts' if timed_out else 'failures')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['breaker'] = self.breaker.stats()
+        stats['latency'] = self.latency.snapshot()
+        stats['timeout_seconds'] = self.timeout
+        delay = self.hedge_delay()
+        stats['hedge_delay_ms'] = round(delay * 1000, 1) if delay is not None else None
+        return stats
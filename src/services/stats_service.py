@@ -0,0 +1,114 @@
+import os
+from datetime import datetime
+from typing import Dict, Any
+from sqlalchemy import func, case, or_, select, text
+from src.models.nutriai_models import db, DietPlan, NutritionistStats
+
+
+def rollup_enabled() -> bool:
+    """Indica se o dashboard deve ler a tabela de consolidação nutritionist_stats"""
+    return os.getenv('STATS_ROLLUP_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
+
+def stats_statement(nutritionist_id: int):
+    """Consulta agregada das estatísticas (também verificada pelo explain-hot-queries)"""
+    mine = DietPlan.nutritionist_id == nutritionist_id
+    return select(
+        func.count(case((mine, 1))).label('total_validated'),
+        func.count(case((mine & (DietPlan.status == 'approved'), 1))).label('approved'),
+        func.count(case((mine & (DietPlan.status == 'rejected'), 1))).label('rejected'),
+        func.count(case((DietPlan.status == 'pending', 1))).label('pending'),
+        func.count(func.distinct(case((mine, DietPlan.user_id)))).label('unique_patients'),
+    ).where(or_(mine, DietPlan.status == 'pending'))
+
+
+def compute_stats(nutritionist_id: int) -> Dict[str, int]:
+    """Calcula todas as estatísticas do nutricionista em uma única consulta agregada"""
+    row = db.session.execute(stats_statement(nutritionist_id)).one()
+    return dict(row._mapping)
+
+
+def read_stats(nutritionist_id: int) -> Dict[str, int]:
+    """Lê as estatísticas da consolidação (uma linha) mais o total de pendentes"""
+    if not rollup_enabled():
+        return compute_stats(nutritionist_id)
+
+    rollup = db.session.get(NutritionistStats, nutritionist_id)
+    return {
+        'total_validated': rollup.total_validated if rollup else 0,
+        'approved': rollup.approved if rollup else 0,
+        'rejected': rollup.rejected if rollup else 0,
+        'pending': DietPlan.query.filter_by(status='pending').count(),
+        'unique_patients': rollup.unique_patients if rollup else 0,
+    }
+
+
+def format_stats(stats: Dict[str, int]) -> Dict[str, Any]:
+    """Adiciona a taxa de aprovação ao dicionário de estatísticas"""
+    total_validated = stats['total_validated']
+    approval_rate = (stats['approved'] / total_validated * 100) if total_validated > 0 else 0
+    return {**stats, 'approval_rate': round(approval_rate, 1)}
+
+
+def record_validation(nutritionist_id: int, patient_id: int, status: str):
+    """
+    Atualiza a consolidação na mesma transação da validação do plano.
+    Deve ser chamada antes de atribuir nutritionist_id ao plano.
+    """
+    if not rollup_enabled():
+        return
+
+    # Upsert em um só comando: primeiras validações simultâneas do mesmo
+    # nutricionista não disputam o INSERT da linha
+    db.session.execute(text(
+        "INSERT INTO nutritionist_stats "
+        "(nutritionist_id, total_validated, approved, rejected, unique_patients, updated_at) "
+        "VALUES (:nutritionist_id, 1, :approved, :rejected, 0, :now) "
+        "ON CONFLICT (nutritionist_id) DO UPDATE SET "
+        "total_validated = nutritionist_stats.total_validated + 1, "
+        "approved = nutritionist_stats.approved + excluded.approved, "
+        "rejected = nutritionist_stats.rejected + excluded.rejected, "
+        "updated_at = excluded.updated_at"
+    ), {
+        'nutritionist_id': nutritionist_id,
+        'approved': 1 if status == 'approved' else 0,
+        'rejected': 1 if status == 'rejected' else 0,
+        'now': datetime.utcnow()
+    })
+
+    # A linha fica travada até o commit: validações concorrentes do mesmo
+    # nutricionista chegam aqui em sequência e já enxergam os planos das anteriores
+    new_patient = not db.session.query(
+        DietPlan.query.filter_by(nutritionist_id=nutritionist_id, user_id=patient_id).exists()
+    ).scalar()
+    if new_patient:
+        NutritionistStats.query.filter_by(nutritionist_id=nutritionist_id).update(
+            {NutritionistStats.unique_patients: NutritionistStats.unique_patients + 1}, synchronize_session=False
+        )
+
+
+def rebuild_rollups() -> int:
+    """Recalcula do zero a tabela nutritionist_stats; retorna o número de linhas"""
+    rows = db.session.query(
+        DietPlan.nutritionist_id,
+        func.count(DietPlan.id),
+        func.count(case((DietPlan.status == 'approved', 1))),
+        func.count(case((DietPlan.status == 'rejected', 1))),
+        func.count(func.distinct(DietPlan.user_id)),
+    ).filter(DietPlan.nutritionist_id.isnot(None)).group_by(DietPlan.nutritionist_id).all()
+
+    NutritionistStats.query.delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.session.add_all([
+        NutritionistStats(
+            nutritionist_id=nutritionist_id,
+            total_validated=total_validated,
+            approved=approved,
+            rejected=rejected,
+            unique_patients=unique_patients,
+            updated_at=now
+        )
+        for nutritionist_id, total_validated, approved, rejected, unique_patients in rows
+    ])
+    db.session.commit()
+    return len(rows)
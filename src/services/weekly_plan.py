@@ -0,0 +1,111 @@
+"""
+Planos de vários dias: cada dia é gerado como um plano de 1 dia (em
+paralelo) e os dias são reunidos em um único plano com seções por dia e
+totais da semana.
+"""
+import os
+from typing import Any, Dict, List, Set
+
+# Tema de cada dia para variar o cardápio mesmo com os dias gerados em paralelo
+DAY_THEMES = (
+    'pratos tradicionais da culinária brasileira',
+    'refeições rápidas, prontas em até 20 minutos',
+    'receitas de forno e assados',
+    'saladas completas e pratos leves',
+    'inspiração mediterrânea',
+    'inspiração asiática, com legumes salteados',
+    'comida caseira de fim de semana',
+)
+
+
+def max_days() -> int:
+    return int(os.getenv('PLAN_MAX_DAYS', 7))
+
+
+def requested_days(value) -> int:
+    """Número de dias pedido (1 se ausente); ValueError se inválido"""
+    if value in (None, ''):
+        return 1
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        days = 0
+    if not 1 <= days <= max_days():
+        raise ValueError(f'days deve ser um número inteiro entre 1 e {max_days()}')
+    return days
+
+
+def day_theme(day: int) -> str:
+    return DAY_THEMES[(day - 1) % len(DAY_THEMES)]
+
+
+def plan_days(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Os planos diários contidos no plano (o próprio plano, se for de 1 dia)"""
+    days = plan.get('days')
+    return days if isinstance(days, list) else [plan]
+
+
+def used_foods(engine, plan: Dict[str, Any]) -> Set[int]:
+    """Índices (tabela de composição) dos alimentos usados no plano"""
+    from src.services.gemini_service import MEAL_KEYS
+    from src.services.nutrition import parse_food
+
+    used = set()
+    for meal in MEAL_KEYS:
+        for item in (plan.get(meal) or {}).get('foods') or []:
+            parsed = parse_food(item) if isinstance(item, str) else None
+            index = engine.resolve(parsed[0]) if parsed else -1
+            if index >= 0:
+                used.add(index)
+    return used
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def refresh_totals(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Refaz os totais da semana a partir dos dias. total_cost, total_calories
+    e total_macros do plano ficam como média diária, comparáveis aos planos
+    de 1 dia nas listagens e filtros
+    """
+    days = plan['days']
+    weekly = {
+        'total_cost': round(sum(_number(day.get('total_cost')) for day in days), 2),
+        'total_calories': int(round(sum(_number(day.get('total_calories')) for day in days))),
+        'total_macros': {
+            macro: round(sum(_number((day.get('total_macros') or {}).get(macro)) for day in days), 1)
+            for macro in ('protein', 'carbs', 'fat')
+        }
+    }
+    count = max(len(days), 1)
+    plan['total_days'] = len(days)
+    plan['weekly_totals'] = weekly
+    plan['total_cost'] = round(weekly['total_cost'] / count, 2)
+    plan['total_calories'] = int(round(weekly['total_calories'] / count))
+    plan['total_macros'] = {macro: round(value / count, 1) for macro, value in weekly['total_macros'].items()}
+    return plan
+
+
+def merge_days(day_plans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reúne os planos diários (em ordem) em um plano de vários dias"""
+    days = []
+    for number, day_plan in enumerate(day_plans, start=1):
+        day = {'day': number, 'theme': day_theme(number)}
+        day.update({key: value for key, value in day_plan.items() if key not in ('day', 'theme')})
+        days.append(day)
+
+    local_days = [day['day'] for day in days if day.get('generator') == 'local']
+    plan = {'days': days}
+    refresh_totals(plan)
+    plan['nutritionist_notes'] = (
+        f"Cardápio de {len(days)} dias com temas variados; os totais do plano são a média diária "
+        f"(totais da semana em weekly_totals)."
+    )
+    if local_days:
+        plan['local_days'] = local_days
+    return plan
@@ -0,0 +1,146 @@
+"""
+Manifesto dos arquivos estáticos: montado uma vez na inicialização, evita
+consultas ao sistema de arquivos por requisição e permite ETag, cache
+imutável para arquivos com hash no nome e variantes gzip/brotli pré-geradas.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Arquivos gerados pelo bundler com hash no nome: hexadecimal (main.3f9a1c2b.css) ou o
+# base64url de 8 caracteres do Vite/Rollup (index-B3xK_9aZ.js). O base64url precisa de
+# um dígito, maiúscula ou "_" para não confundir nomes como apple-touch-icon.png.
+# STATIC_HASHED_ASSET_RE substitui o padrão (outros bundlers / tamanhos de hash)
+HASHED_ASSET_RE = re.compile(os.getenv('STATIC_HASHED_ASSET_RE') or (
+    r'[.-](?:[0-9a-fA-F]{8,}|(?=[A-Za-z0-9_-]{0,7}[0-9A-Z_])[A-Za-z0-9_-]{8})\.[A-Za-z0-9]+$'
+))
+
+# (codificação em Accept-Encoding, extensão do arquivo pré-comprimido), em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'application/manifest+json', 'image/x-icon',
+                      'image/vnd.microsoft.icon')
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+
+class Asset:
+    def __init__(self, path: str, rel_path: str):
+        self.path = path
+        self.rel_path = rel_path
+        self.mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        self.immutable = bool(HASHED_ASSET_RE.search(rel_path))
+
+        with open(path, 'rb') as f:
+            self.etag = hashlib.sha256(f.read()).hexdigest()[:32]
+
+        # Variantes pré-comprimidas válidas (mais novas que o original)
+        mtime = os.path.getmtime(path)
+        self.variants: Dict[str, str] = {}
+        for encoding, extension in ENCODINGS:
+            variant = path + extension
+            if os.path.exists(variant) and os.path.getmtime(variant) >= mtime:
+                self.variants[encoding] = variant
+
+    @property
+    def cache_control(self) -> str:
+        return IMMUTABLE_CACHE if self.immutable else REVALIDATE_CACHE
+
+
+class AssetManifest:
+    def __init__(self, static_folder: Optional[str]):
+        self.static_folder = static_folder
+        self.assets: Dict[str, Asset] = {}
+        self.build()
+
+    def build(self):
+        """Percorre a pasta estática e registra cada arquivo servível"""
+        assets = {}
+        if self.static_folder and os.path.isdir(self.static_folder):
+            for root, _, files in os.walk(self.static_folder):
+                for name in files:
+                    if name.endswith(tuple(extension for _, extension in ENCODINGS)):
+                        continue
+                    path = os.path.join(root, name)
+                    rel_path = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                    assets[rel_path] = Asset(path, rel_path)
+        self.assets = assets
+
+    def get(self, rel_path: str) -> Optional[Asset]:
+        return self.assets.get(rel_path)
+
+    @property
+    def index(self) -> Optional[Asset]:
+        return self.assets.get('index.html')
+
+
+def accepted_encodings() -> set:
+    """Codificações aceitas pelo cliente (ignorando as marcadas com q=0)"""
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        token, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def send_asset(asset: Asset):
+    """Envia o arquivo (ou sua variante comprimida) com ETag e respostas 304"""
+    accepted = accepted_encodings()
+    encoding = next((enc for enc, _ in ENCODINGS if enc in asset.variants and enc in accepted), None)
+
+    # Cada representação tem seu próprio ETag forte
+    etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        path = asset.variants[encoding] if encoding else asset.path
+        response = send_file(path, mimetype=asset.mimetype, etag=False, conditional=False)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = asset.cache_control
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def precompress_static(static_folder: str, min_size: int = 1024, log=print) -> int:
+    """Gera as variantes .gz (e .br, se brotli estiver instalado) dos arquivos compressíveis"""
+    generated = 0
+    for rel_path, asset in AssetManifest(static_folder).assets.items():
+        if not asset.mimetype.startswith(COMPRESSIBLE_TYPES):
+            continue
+        with open(asset.path, 'rb') as f:
+            data = f.read()
+        if len(data) < min_size:
+            continue
+
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+
+        for extension, compressed in variants.items():
+            if len(compressed) >= len(data):
+                continue
+            with open(asset.path + extension, 'wb') as f:
+                f.write(compressed)
+            generated += 1
+            log(f"  {rel_path}{extension}: {len(data)} → {len(compressed)} bytes")
+    return generated
@@ -0,0 +1,45 @@
+"""
+O streaming do plano devolve a chamada de teste do disjuntor mesmo quando
+o cliente SSE desconecta no meio da resposta.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def _half_open_service(monkeypatch):
+    from src.services.fake_gemini import FakeGeminiModel
+    from src.services.gemini_service import GeminiService
+    from src.services.resilience import CircuitBreaker, ResilientCaller
+
+    monkeypatch.setenv('PLAN_GENERATOR', 'gemini')
+    service = GeminiService()
+    service.model = FakeGeminiModel(latency=0, jitter=0, seed=1)
+    service.resilience = ResilientCaller('gemini-test', timeout=5,
+                                         breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    monkeypatch.setattr(service, '_find_approved_plan', lambda user_data: None)
+
+    # Uma falha abre o disjuntor; com reset_timeout=0 a próxima chamada é o teste (half_open)
+    service.resilience.breaker.record_failure()
+    return service
+
+
+def test_disconnect_during_probe_releases_breaker(monkeypatch):
+    service = _half_open_service(monkeypatch)
+    user_data = {'user_id': 1, 'age': 30, 'weight': 70, 'height': 175, 'goal': 'Perder peso',
+                 'budget_per_meal': 20}
+
+    events = service.stream_diet_plan(user_data)
+    assert next(events)[0] == 'meal'
+    assert service.resilience.breaker.state == 'half_open'
+
+    # Cliente desconectou: o Flask fecha o gerador (GeneratorExit no yield)
+    events.close()
+    assert service.resilience.breaker.state == 'open'
+    assert service.resilience.stats()['failures'] == 1
+
+    # O disjuntor não fica preso: a próxima chamada de teste passa e o fecha
+    kinds = [kind for kind, _ in service.stream_diet_plan(dict(user_data, goal='Ganhar massa'))]
+    assert kinds[-1] == 'plan'
+    assert service.resilience.breaker.state == 'closed'
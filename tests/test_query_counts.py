@@ -0,0 +1,111 @@
+"""
+As listagens de planos fazem um número constante de consultas ao banco,
+independente de quantos planos a página tem (sem N+1).
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+SAMPLE_PLAN = {
+    'breakfast': {'description': 'Ovos com pão', 'foods': ['Ovos (2 unidades)', 'Pão integral (2 fatias)'],
+                  'preparation': 'Preparar os ovos', 'estimated_cost': 5.0, 'calories': 400,
+                  'macros': {'protein': 20, 'carbs': 40, 'fat': 12}},
+    'total_cost': 5.0,
+    'total_calories': 400,
+    'total_macros': {'protein': 20, 'carbs': 40, 'fat': 12}
+}
+
+# (nome, perfil, rota, consultas esperadas: versões para o ETag + página [+ total de pendentes])
+ENDPOINTS = (
+    ('my-plans', 'user', '/api/diet-plans/my-plans', 2),
+    ('pending', 'nutritionist', '/api/diet-plans/pending', 3),
+    ('summary', 'user', '/api/diet-plans/my-plans?fields=summary', 2),
+)
+
+
+@pytest.fixture(scope='module')
+def app():
+    folder = tempfile.mkdtemp()
+    os.environ['NEON_DATABASE_URL'] = f"sqlite:///{os.path.join(folder, 'test.db')}"
+    os.environ.setdefault('PLAN_GENERATOR', 'local')
+    from src.main import app
+    from src.models.nutriai_models import db, User
+
+    with app.app_context():
+        db.create_all()
+        for email, user_type in (('user@test', 'user'), ('nutri@test', 'nutritionist')):
+            user = User(email=email, name=email, user_type=user_type, goal='Perder peso', budget_per_meal=20)
+            user.set_password('senha')
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def _login(client, email):
+    response = client.post('/api/auth/login', json={'email': email, 'password': 'senha'})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+
+def _add_plans(app, start, count):
+    """
+    Cada rodada cria um plano pendente de um paciente novo e um plano de
+    user@test aprovado por um nutricionista novo: sem carregamento
+    antecipado, cada usuário/nutricionista custaria uma consulta a mais
+    """
+    from src.models.nutriai_models import db, DietPlan, User
+
+    with app.app_context():
+        user = User.query.filter_by(email='user@test').one()
+        for i in range(start, start + count):
+            # Sem login: dispensa o hash de senha
+            patient = User(email=f'patient{i}@test', name=f'Paciente {i}', user_type='user', password_hash='-')
+            nutritionist = User(email=f'nutri{i}@test', name=f'Nutricionista {i}', user_type='nutritionist',
+                                password_hash='-')
+            db.session.add_all([patient, nutritionist])
+            db.session.flush()
+
+            pending = DietPlan(user_id=patient.id, goal='Perder peso', budget_per_meal=20)
+            approved = DietPlan(user_id=user.id, goal='Perder peso', budget_per_meal=20,
+                                status='approved', nutritionist_id=nutritionist.id)
+            for plan in (pending, approved):
+                plan.set_ai_plan(SAMPLE_PLAN)
+                db.session.add(plan)
+        db.session.commit()
+
+
+def _count_queries(app, client, url, headers):
+    from src.models.nutriai_models import db
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Primeira chamada aquece caches (identidade, metadados); conta a segunda
+    assert client.get(url, headers=headers).status_code == 200
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_list_endpoints_use_constant_queries(app):
+    client = app.test_client()
+    headers = {'user': _login(client, 'user@test'), 'nutritionist': _login(client, 'nutri@test')}
+
+    added = 0
+    for total in (2, 6):
+        _add_plans(app, added, total - added)
+        added = total
+        for name, role, url, expected in ENDPOINTS:
+            assert _count_queries(app, client, url, headers[role]) == expected, f'{name} com {total} planos'